@@ -21,10 +21,11 @@
 
 
 import argparse
+import os
 
-# This function gets the command line arguments. It exists mainly to keep the 
-# the main file more tidy.
-def get_args():
+# This function returns the parser for the command line arguments. Other 
+# programs (e.g., benchmark_route_search.py) can add their own arguments.
+def get_parser():
 	parser = argparse.ArgumentParser()
 
 	# The maximum cargo space of your ship. The only argument that is required
@@ -41,7 +42,7 @@ def get_args():
 	keyword = '--jumprange'
 	short = '-j'
 	this = 'The (laden) jumprange of your ship in ligthyears. Default is '
-	that = '20 ly. A significant change requires rebuilding of the database.'
+	that = '20 ly. A change leads to building a new database.'
 	parser.add_argument(keyword, short, metavar = 'ly', type = float, \
 											default = 20.0, help = this + that)
 
@@ -49,8 +50,8 @@ def get_args():
 	keyword = '--size'
 	short = '-s'
 	this = 'The padsize your ship needs. Default is L. Use "M" '
-	that = '(without quotes) if you have a smaller ship. A change requires '
-	siht = 'rebuilding the database.'
+	that = '(without quotes) if you have a smaller ship. A change leads to '
+	siht = 'building a new database.'
 	parser.add_argument(keyword, short, type = str, metavar = 'padsize', \
 									default = 'L', help = this + that + siht)
 
@@ -67,7 +68,7 @@ def get_args():
 	metavar = 'foo'
 	this = 'The maximum number of jumps you would perform (one way) to get a '
 	that = 'commodity. Needs to be an integer. Default is 8. A change '
-	siht = 'requires rebuilding the database.'
+	siht = 'leads to building a new database.'
 	parser.add_argument(keyword, short, type = int, default = 8,\
 													help = this + that + siht)
 
@@ -82,8 +83,8 @@ def get_args():
 	short = '-md'
 	this = 'The maximum distance (in lightseconds) a station shall have from '
 	that = 'the point of entry into a system to be considered. Default is '
-	siht = '2500 ls. Needs to be an integer. A change requires rebuilding '
-	taht = 'the database.'
+	siht = '2500 ls. Needs to be an integer. A change leads to building a '
+	taht = 'new database.'
 	parser.add_argument(keyword, short, metavar = 'ls', type = int, \
 							default = 2500, help = this + that + siht + taht)
 
@@ -98,6 +99,56 @@ def get_args():
 	parser.add_argument(keyword, short, type = int, default = 100, \
 													help = this + that + siht)
 
+	# The number of processes that are used for reading the listings file 
+	# when the database is build and for searching routes. It's just one 
+	# process by default (like it always was). More need to be asked for.
+	keyword = '--workers'
+	short = '-w'
+	this = 'The number of processes used to build the database and to search '
+	that = 'routes. Needs to be an integer. Default is 1 (everything in one '
+	siht = 'process).'
+	parser.add_argument(keyword, short, type = int, default = 1, \
+													help = this + that + siht)
+
+	# Where updates of the commodities at single stations can be read from. 
+	# This way the database doesn't need to be build again from the whole 
+	# listings file just because a few stations changed.
+	keyword = '--market-updates'
+	short = '-mu'
+	this = 'A file or "host:port" from where updates of the commodities at '
+	that = 'single stations are read (one JSON object per line). The '
+	siht = 'database is updated accordingly.'
+	parser.add_argument(keyword, short, metavar = 'source', \
+								type = market_source, help = this + that + siht)
+
+	# How all possible routes are searched. Both find a best route. If 
+	# several routes are equally good, they may find different ones.
+	keyword = '--engine'
+	short = '-e'
+	this = 'How all possible routes are searched: "search" (go through them '
+	that = 'but skip what can\'t be better) or "dp" (figure out what can be '
+	siht = 'achieved from each situation just once). Default is "search".'
+	parser.add_argument(keyword, short, type = str, default = 'search', \
+				choices = ['search', 'dp'], help = this + that + siht)
+
+	# How routes are searched if there are too many to search all of them.
+	keyword = '--heuristic'
+	short = '-hr'
+	this = 'How routes are searched with more than 15 stations: "improve" '
+	that = '(change a route step by step) or "shuffle" (try random routes, '
+	siht = 'many at once). Default is "improve".'
+	parser.add_argument(keyword, short, type = str, default = 'improve', \
+				choices = ['improve', 'shuffle'], help = this + that + siht)
+
+	# After how many seconds the search for a better route stops. The best 
+	# route found until then is taken. A first route is there right away.
+	keyword = '--time-limit'
+	short = '-tl'
+	this = 'After how many seconds the search for a better route stops and '
+	that = 'the best route so far is taken. Default is no limit.'
+	parser.add_argument(keyword, short, metavar = 's', type = float, \
+											default = None, help = this + that)
+
 	# The path to where all the downloaded files shall be.
 	keyword = '--path'
 	short = '-p'
@@ -125,19 +176,20 @@ def get_args():
 	# that isn't available close by.
 	keyword = '--commodity-available'
 	short = '-ca'
-	this = 'Check if a commodity is available at relevant stations. All other '
-	that = 'actions will be ignored if this is set. < commodity > needs to be '
-	siht = 'written as in the game.'
-	parser.add_argument(keyword, short, metavar = 'commodity of interest', \
-										type = str, help = this + that + siht)
-
-	# If the database shall be rebuild. Necessary if the parameters changed
-	# or if newer files were downloaded manually.
+	this = 'Check if one or more commodities are available at relevant '
+	that = 'stations and show the best stations for each. All other actions '
+	siht = 'will be ignored if this is set. Upper and lower case do not matter.'
+	parser.add_argument(keyword, short, metavar = 'commodity', \
+							type = str, nargs = '+', help = this + that + siht)
+
+	# If the database shall be rebuild. Usually not necessary since a 
+	# database is build automatically for each new combination of parameters 
+	# and files.
 	keyword = '--build-database'
 	short = '-b'
-	this = 'Force build the database. Needs to be done if the ship or user '
-	that = 'parameters (e.g. the "home coordinates") have change significantly '
-	siht = 'or if newer files were downloaded manually. Will ignore < run >.'
+	this = 'Force build the database. Usually not necessary since a database '
+	that = 'is build automatically if the parameters or the files have '
+	siht = 'changed. Will ignore < run >.'
 	parser.add_argument(keyword, short, action = 'store_true', \
 													help = this + that + siht)
 
@@ -147,7 +199,13 @@ def get_args():
 	this = 'Force download the necessary files from EDDB.io. Will ignore < run >.'
 	parser.add_argument(keyword, short, action = 'store_true', help = this)
 
-	args = parser.parse_args()
+	return parser
+
+
+# This function gets the command line arguments. It exists mainly to keep the 
+# the main file more tidy.
+def get_args():
+	args = get_parser().parse_args()
 
 	# The program shall run automatically without further input in all cases
 	# EXCEPT if I just want to know if a commodity is available.
@@ -161,6 +219,23 @@ def get_args():
 	return args
 
 
+# This function checks the argument of --market-updates: < source > needs 
+# to be an existing file or "host:port" (see 
+# DataGrabber._read_market_updates()). Otherwise argparse tells the user 
+# what is wrong.
+def market_source(source):
+	if os.path.isfile(source):
+		return source
+
+	host, _, port = source.rpartition(':')
+	if not host or not port.isdigit():
+		this = '< {} > is neither an existing file nor '.format(source)
+		that = '"host:port" (with a number as port).'
+		raise argparse.ArgumentTypeError(this + that)
+
+	return source
+
+
 # This function simply prints the result.
 # < route > is the instance of class Routefinder(). 
 def print_results(route):
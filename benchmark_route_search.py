@@ -0,0 +1,102 @@
+#    "benchmark_route_search" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This program compares how good the routes are that the two ways to find a
+# route for many locations find (see --heuristic): trying random routes 
+# ('shuffle') and improving a route step by step ('improve').
+#
+# Each run is a RouteFinder() like in trade_mission_optimizer.py, with the 
+# same ship, engine and number of processes. Both ways get the same time 
+# (--time-limit, not the same number of routes!) since that is what 
+# matters when I wait for the result. Each is run with several seeds since
+# one run may just be lucky. For each run the best score (missions that stay
+# open / commodities that still need to be bought) and how many routes were
+# looked at in that time is shown.
+#
+# ATTENTION: With up to 15 stations all routes are searched (see 
+# RouteFinder.exact_search_limit). Then both ways do the same.
+#
+# The missions file, the database and all arguments are the same as for
+# trade_mission_optimizer.py. E.g.:
+#
+# python3 benchmark_route_search.py -p path/to/missions/ -c 230 -tl 10
+
+import contextlib
+import io
+import additional_functions as af
+import class_trader as ct
+import class_routefinder as cf
+
+
+# This function gets the command line arguments: the ones of 
+# trade_mission_optimizer.py and the ones just for the benchmark.
+def get_args():
+	parser = af.get_parser()
+
+	keyword = '--seeds'
+	short = '-n'
+	this = 'With how many different seeds each way is run. Default is 5.'
+	parser.add_argument(keyword, short, type = int, default = 5, help = this)
+
+	args = parser.parse_args()
+
+	# Without a limit a run would take as long as it takes.
+	if args.time_limit is None:
+		args.time_limit = 10.0
+
+	return args
+
+
+# This function runs a RouteFinder() with the way < heuristic > and < seed >.
+# It returns the best score and how many routes were looked at.
+def run(trader, args, heuristic, seed):
+	cf.RouteFinder.seed = seed
+
+	# The RouteFinder() tells a lot while it searches. Here just the result 
+	# is of interest.
+	with contextlib.redirect_stdout(io.StringIO()):
+		finder = cf.RouteFinder(trader, args.engine, args.time_limit, \
+												heuristic = heuristic)
+
+	score = (finder.best_remaining_missions, finder.best_needed_commodities)
+
+	# If the first route is already perfect, nothing is searched.
+	return score, getattr(finder, 'routes_checked', 0)
+
+
+if __name__ == '__main__':
+	args = get_args()
+
+	trader = ct.Trader(args.path, args.jumprange, args.cargo, args.size, \
+					args.max_jumps, args.max_distance, args.minimum_supply, \
+					args.workers, args.market_updates)
+
+	print("\n{} locations, {} s per run".format(sum(len(stations) for \
+						stations in trader.locations.values()), args.time_limit))
+	print("{:<10}{:>6}{:>10}{:>14}".format('way', 'seed', 'score', 'routes'))
+
+	for heuristic in ('shuffle', 'improve'):
+		scores = []
+		for seed in range(args.seeds):
+			score, routes = run(trader, args, heuristic, seed)
+			scores.append(score)
+			print("{:<10}{:>6}{:>10}{:>14}".format(heuristic, seed, \
+									'{}/{}'.format(*score), routes))
+
+		print("{:<10}{:>16}".format(heuristic + ' best', \
+									'{}/{}'.format(*min(scores))))
@@ -21,8 +21,18 @@
 
 
 # A simple object that helps to handle several commodites.
+# Routes are NOT flown with copies of the commodities but on the flat lists
+# of class RouteState() (undoing what a route did via its log). Copies of a 
+# Trader() and its commodities are made just a few times per run (see 
+# RouteFinder()). The __slots__ keep each of the commodities small anyway.
 class Commodity(object):
-	def __init__(self, name):
+	__slots__ = ('id', 'name', 'quantity', 'sell_at', 'buy_at')
+
+	# < this_id > is the id of the commodity in Trader.commodities. It is also
+	# the position of the commodity in Trader.warez and the bit that stands 
+	# for it in a bitset of commodities.
+	def __init__(self, name, this_id):
+		self.id = this_id
 		self.name = name
 		# This is the quantity the ship has at a given location in the cargo.
 		# If one commodity is bought, the total necessary amount will be bought.
@@ -42,6 +52,24 @@ class Commodity(object):
 		self.buy_at = {}
 
 
+	# A copy is made when RouteFinder() copies the Trader() (at the start 
+	# and to fly the best route once more). Just self.quantity and 
+	# self.sell_at change while the best route is flown. self.buy_at is 
+	# complete once the Trader() is created and it is never changed 
+	# afterwards. Thus copies can share it.
+	def __deepcopy__(self, memo):
+		this = Commodity.__new__(Commodity)
+		this.id = self.id
+		this.name = self.name
+		this.quantity = self.quantity
+		this.sell_at = {system:dict(stations) for system, stations in \
+														self.sell_at.items()}
+		this.buy_at = self.buy_at
+		memo[id(self)] = this
+
+		return this
+
+
 	# When mission data is parsed, the respective information needs to be 
 	# stored properly. This method helps with that and considers all 
 	# eventuallities that could trigger errors.
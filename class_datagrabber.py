@@ -29,9 +29,18 @@
 from time import time
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import pickle
 import json
-from math import sqrt
+import hashlib
+import gzip
+import threading
+import socket
+import multiprocessing
+import numpy as np
+import class_spatialindex as cs
+import class_listingsscanner as cl
+import class_stationdatabase as sd
 
 
 # This class is doing all the staff to get and structure the rawdata.
@@ -40,6 +49,22 @@ from math import sqrt
 # elite_trade_mission_optimizer.py if the respective arguments are stated when
 # calling the latter.
 class DataGrabber(object):
+	# Databases for different parameters are kept side by side. If all of them
+	# together are larger than this (in bytes), the ones that weren't used 
+	# for the longest time are deleted.
+	cache_size = 268435456
+
+	# Where the rawdata files are downloaded from and how much of a file is
+	# held in memory at once (in bytes) while it is downloaded.
+	download_url = 'https://eddb.io/archive/v6/'
+	download_chunk_size = 1048576
+
+	# How many of the stations that have a commodity find_commodity() shows.
+	stations_shown = 5
+	# The downloads run in parallel but just one may save the download state
+	# at a time (see _save_download_state()).
+	download_state_lock = threading.Lock()
+
 	# < path > is the path to the (raw)data files.
 	# < trader > is the instance of class Trader(). It contains certain 
 	# attributes that I need here.
@@ -49,15 +74,27 @@ class DataGrabber(object):
 		self.stations_file = self.path + 'stations.json'
 		self.commodities_file = self.path + 'commodities.json'
 		self.listings_file = self.path + 'listings.csv'
-		self.data_file = path + '111_data_for_today'
+		# This is the directory where all databases are stored. The file of 
+		# the database for the given parameters is set in build_database().
+		self.data_directory = path + '111_data_for_today'
+		self.data_file = None
+		self.coordinates_file = path + '111_system_coordinates.npy'
+		self.spatial_index_file = path + '111_spatial_index.npz'
 
 		self.trader = trader
 
-		# Is set to True if the necessary files were download. This way it is 
-		# taken care of the case that I don't want to rebuild the database if 
-		# the data isn't new.
+		# Is set to True if the content of the necessary files has changed. 
+		# This way it is taken care of the case that I don't want to rebuild 
+		# the database if the data isn't new.
 		self.grab_data_from_raw = False
 
+		# See _load_download_state().
+		self.download_state_file = path + '111_downloads.json'
+		self.download_state = self._load_download_state()
+
+		# See _read_market_updates().
+		self.market_feed_file = path + '111_market_feed.json'
+
 		# This is what I'm actually interested in. It will contain JUST the 
 		# stations that a relevant to consider given the parameters given
 		# by the user. The structure of this dict
@@ -89,54 +126,199 @@ class DataGrabber(object):
 		self.build_database()
 
 
+	# The rawdata files are huge and json.load() would need to hold the whole
+	# list of dicts in memory. This generator reads < this_file > in chunks
+	# instead and yields one element of the top-level list at a time. Thus
+	# memory usage does not depend on the size of the file.
+	# < chunk_size > is the number of characters read at once.
+	def _stream_json(self, this_file, chunk_size = 1048576):
+		decoder = json.JSONDecoder()
+		whitespace = ' \t\n\r,'
+
+		with open(this_file, 'r', encoding = 'utf-8-sig') as f:
+			buffer = ''
+			position = 0
+			end_of_file = False
+			started = False
+
+			while True:
+				# Skip everything between two elements.
+				while position < len(buffer) and buffer[position] in whitespace:
+					position += 1
+
+				if started and position < len(buffer) and buffer[position] == ']':
+					return
+
+				if not started and position < len(buffer):
+					# The file needs to start with the opening bracket of the 
+					# list. Everything else isn't what I expect.
+					if buffer[position] != '[':
+						raise ValueError("{} is not a JSON list.".format(this_file))
+					position += 1
+					started = True
+					continue
+
+				# An element can be cut in two at the end of a chunk. In that 
+				# case decoding fails and I need to read more.
+				# ATTENTION: If the decoding ends exactly at the end of the 
+				# buffer the element may be incomplete, too (e.g. a number).
+				try:
+					element, end = decoder.raw_decode(buffer, position)
+					complete = end < len(buffer) or end_of_file
+				except json.JSONDecodeError:
+					if end_of_file:
+						raise
+					complete = False
+
+				if complete:
+					yield element
+					position = end
+					continue
+
+				if end_of_file:
+					return
+
+				chunk = f.read(chunk_size)
+				end_of_file = not chunk
+				# Don't keep what was already decoded.
+				buffer = buffer[position:] + chunk
+				position = 0
+
+
+	# Parsing the systems file takes long. However, of each system just the id, 
+	# the name and the coordinates are needed. These are extracted once per 
+	# download into self.coordinates_file. The latter can be memory-mapped
+	# and all systems can be checked at once with numpy. Thus changing the 
+	# home system or the jumprange doesn't require going through the systems
+	# file again.
+	def _build_system_coordinates(self):
+		print("Extracting the system coordinates ...")
+
+		ids = []
+		names = []
+		coordinates = []
+
+		for system in self._stream_json(self.systems_file):
+			ids.append(system['id'])
+			names.append(system['name'])
+			coordinates.append((system['x'], system['y'], system['z']))
+
+		# A numpy string needs a fixed length.
+		longest = max([len(name) for name in names] + [1])
+		dtype = [('id', 'i8'), ('name', 'U{}'.format(longest)), \
+									('x', 'f8'), ('y', 'f8'), ('z', 'f8')]
+
+		systems = np.zeros(len(ids), dtype = dtype)
+		systems['id'] = ids
+		systems['name'] = names
+		if coordinates:
+			xyz = np.array(coordinates, dtype = 'f8')
+			systems['x'] = xyz[:, 0]
+			systems['y'] = xyz[:, 1]
+			systems['z'] = xyz[:, 2]
+
+		np.save(self.coordinates_file, systems)
+
+
+	# This method returns the (memory-mapped) array with the ids, names and 
+	# coordinates of all systems. It is (re)build if the systems file is 
+	# newer than the array.
+	def _load_system_coordinates(self):
+		outdated = not os.path.isfile(self.coordinates_file)
+
+		if not outdated:
+			this = os.path.getmtime(self.coordinates_file)
+			outdated = this < os.path.getmtime(self.systems_file)
+
+		if outdated:
+			self._build_system_coordinates()
+
+		return np.load(self.coordinates_file, mmap_mode = 'r')
+
+
 	# The user shall NOT provide the coordinates to its home station but just 
 	# the system and station name. Thus I need to figure the former out to find 
 	# the stations that are within the maximum amount of allowed jumps.
-	# For this I need to go through the the systems data once.
-	def _find_home_coordinates(self):
+	# < systems > is the array from _load_system_coordinates().
+	def _find_home_coordinates(self, systems):
 		print("Determining home coordinates ...")
 
-		with open(self.systems_file, 'r', encoding = 'utf-8-sig') as f:
-			systems = json.load(f)
-
-		for system in systems:
-			if self.trader.start_system == system['name']:
-				self.home_coordinates['x'] = system['x']
-				self.home_coordinates['y'] = system['y']
-				self.home_coordinates['z'] = system['z']
+		found = np.flatnonzero(systems['name'] == self.trader.start_system)
 
-				return
+		# If the home system can't be found the home coordinates stay at the 
+		# origin of the galaxy.
+		if len(found):
+			home = systems[found[0]]
+			self.home_coordinates['x'] = float(home['x'])
+			self.home_coordinates['y'] = float(home['y'])
+			self.home_coordinates['z'] = float(home['z'])
 
 
 	# This method checks if a stations is within the maximum number of jumps 
 	# to my home station.
-	# < x_2, y_2, z_2 > are the coordinates of the system for which it shall be 
-	# figured out if it is within the allowed number of jumps.
+	# < x_2, y_2, z_2 > are (numpy arrays of) the coordinates of the systems 
+	# for which it shall be figured out if they are within the allowed number 
+	# of jumps.
 	def _within_maximum_distance(self, x_2, y_2, z_2):
 		x_1 = self.home_coordinates['x']
 		y_1 = self.home_coordinates['y']
 		z_1 = self.home_coordinates['z']
 
-		distance = sqrt((x_1 - x_2)**2 + (y_1 - y_2)**2 + (z_1 - z_2)**2)
+		distance = np.sqrt((x_1 - x_2)**2 + (y_1 - y_2)**2 + (z_1 - z_2)**2)
 
 		return distance / self.trader.jumprange <= self.trader.max_jumps
 
 
+	# Dito for the spatial index over the coordinates of all systems. It is 
+	# rebuild if the coordinates were extracted anew.
+	# < systems > is the array from _load_system_coordinates().
+	def _load_spatial_index(self, systems):
+		index = cs.SpatialIndex()
+
+		outdated = not os.path.isfile(self.spatial_index_file)
+
+		if not outdated:
+			this = os.path.getmtime(self.spatial_index_file)
+			outdated = this < os.path.getmtime(self.coordinates_file)
+
+		if outdated:
+			print("Building the spatial index ...")
+			index.build(systems['x'], systems['y'], systems['z'])
+			index.save(self.spatial_index_file)
+		else:
+			index.load(self.spatial_index_file)
+
+		return index
+
+
 	# This method finds in the systems rawdata all systems that are within
 	# the allowed maximum number of jumps with a given jumprange.
-	def _find_relevant_systems(self):
+	# Just the systems in the vicinity of the home system are checked. These
+	# are found with the spatial index.
+	# < systems > is the array from _load_system_coordinates().
+	def _find_relevant_systems(self, systems):
 		print("Determining relevant systems ...")
 
-		with open(self.systems_file, 'r', encoding = 'utf-8-sig') as f:
-			systems = json.load(f)
+		index = self._load_spatial_index(systems)
+
+		# The exact check is done in _within_maximum_distance(). Thus the 
+		# radius can be a tiny bit larger to not miss any system due to 
+		# rounding errors.
+		radius = self.trader.max_jumps * self.trader.jumprange
+		radius = radius * (1 + 1e-9) + 1e-9
+
+		x = self.home_coordinates['x']
+		y = self.home_coordinates['y']
+		z = self.home_coordinates['z']
+		nearby = systems[index.query(x, y, z, radius)]
 
-		for system in systems:
-			x_2 = system['x']
-			y_2 = system['y']
-			z_2 = system['z']
+		inside = self._within_maximum_distance(nearby['x'], nearby['y'], \
+																nearby['z'])
 
-			if self._within_maximum_distance(x_2, y_2, z_2):
-				self.relevant_systems[system['id']] = system['name']
+		ids = nearby['id'][inside].tolist()
+		names = nearby['name'][inside].tolist()
+
+		self.relevant_systems = dict(zip(ids, names))
 
 
 	# A number of parameters make stations not eligible for going there.
@@ -168,25 +350,44 @@ class DataGrabber(object):
 		return True
 
 
-	# Once the relevant systems are found find the relevant stations in 
-	# these systems. This method fills up self.data.
-	def _find_relevant_stations(self):
-		print("Determining relevant stations ...")
+	# Once the relevant systems are found, all stations in these systems are 
+	# collected. Of each station just what is needed later is kept.
+	# It returns a list with one dict per station.
+	def _find_region_stations(self):
+		print("Determining stations in range ...")
 
-		with open(self.stations_file, 'r', encoding = 'utf-8-sig') as f:
-			stations = json.load(f)
+		keys = ('id', 'name', 'type', 'distance_to_star', 'max_landing_pad_size', \
+											'has_market', 'has_commodities')
 
-			for station in stations:
-				if station['system_id'] not in self.relevant_systems:
-					continue
-				elif not self._fitting_station_parameters(station):
-					continue
+		stations = []
 
-				this = {'type':station['type'], 'name':station['name'], \
-						'system':self.relevant_systems[station['system_id']], \
-						'distance':station['distance_to_star'], 'warez':[]}
+		# The stations file is even larger than the systems file.
+		for station in self._stream_json(self.stations_file):
+			if station['system_id'] not in self.relevant_systems:
+				continue
 
-				self.data[station['id']] = this
+			this = {key:station.get(key) for key in keys}
+			this['system'] = self.relevant_systems[station['system_id']]
+			stations.append(this)
+
+		return stations
+
+
+	# Of the stations in range just the relevant stations are kept. This 
+	# method fills up self.data.
+	# < region > is the dict returned by _collect_region().
+	def _find_relevant_stations(self, region):
+		print("Determining relevant stations ...")
+
+		for station in region['stations']:
+			if not self._fitting_station_parameters(station):
+				continue
+
+			this = {'type':station['type'], 'name':station['name'], \
+					'system':station['system'], \
+					'distance':station['distance_to_star'], 'warez':[]}
+
+			self.data[station['id']] = this
 
 
 	# The available commodities may change in the game, thus I can't hard-code 
@@ -206,65 +407,161 @@ class DataGrabber(object):
 		return relevant_information
 
 
+	# The positions of the relevant information in the listings csv-file 
+	# shall NOT be hardcoded. This method reads them from the header.
+	# < header > is the first line of the listings csv-file.
+	def _listings_columns(self, header):
+		names = [name.strip() for name in header.split(',')]
+
+		return [names.index(name) for name in \
+								('station_id', 'commodity_id', 'supply')]
+
+
+	# This method returns the station ids, commodity ids and supplies of all 
+	# rows in the listings file that belong to one of the stations with an
+	# id in < station_ids > as numpy arrays.
+	def _read_listings(self, station_ids):
+		with open(self.listings_file, 'rb') as f:
+			columns = self._listings_columns(f.readline().decode('utf-8-sig'))
+			start = f.tell()
+			end = os.fstat(f.fileno()).st_size
+
+		# See class_listingsscanner.py for how the file is read.
+		scanner = cl.ListingsScanner(self.listings_file, columns, station_ids)
+
+		# The file can be split up into parts which are scanned in parallel. 
+		# Putting the results together in the same order as the parts gives 
+		# exactly the same as scanning the file in one go.
+		# Starting processes takes some time. Thus small files are not split.
+		workers = self.trader.workers
+		if workers > 1 and end - start > scanner.block_size:
+			ranges = scanner.split(start, end, 2 * workers)
+
+			with multiprocessing.Pool(workers) as pool:
+				parts = pool.starmap(scanner.scan, ranges)
+
+			return [np.concatenate(this) for this in zip(*parts)]
+
+		return scanner.scan(start, end)
+
+
 	# As for stations exist some conditions regarding the relevancy of 
-	# a commodity. This method checks all of them to keep _find_relevant_warez()
-	# more tidy.
-	# < line > is a line from the listings csv-file.
-	def _fitting_commodity_parameters(self, line):
-		# ATTENTION: The positions of the relevant information in the csv-file
-		# is hardcoded. I hope that never changes.
-		station_id = int(line.strip().split(',')[1])
-		supply = int(line.strip().split(',')[3])
-
-		if station_id not in self.data:
-			return False
+	# a commodity. This method checks all of them at once for many rows of 
+	# the listings csv-file and returns a boolean array that is True for 
+	# every row that fits.
+	# < station_ids > and < supplies > are the respective columns.
+	def _fitting_commodity_parameters(self, station_ids, supplies):
+		relevant_stations = np.fromiter(self.data.keys(), dtype = 'i8', \
+														count = len(self.data))
 
-		if supply < self.trader.minimum_supply:
-			return False
+		in_range = np.isin(station_ids, relevant_stations)
+		enough = supplies >= self.trader.minimum_supply
 
-		return True
+		return in_range & enough
 
 
 	# This method finds the relevant commodities at the relevant stations
 	# in the relevant systems. It fills the 'warez'-list for the respective in the station data
 	# of self.data.
-	def _find_relevant_warez(self):
+	# < region > is the dict returned by _collect_region().
+	def _find_relevant_warez(self, region):
 		print("Determining relevant commodities ...")
 
-		commodities = self._get_commodities()
+		commodities = region['commodities']
 
-		with open(self.listings_file, 'r', encoding = 'utf-8-sig') as f:
-			# The first line is the header of the table.
-			f.readline()
+		station_ids, commodity_ids, supplies = region['listings']
+
+		keep = self._fitting_commodity_parameters(station_ids, supplies)
+		station_ids = station_ids[keep]
+		commodity_ids = commodity_ids[keep]
+
+		# Instead of appending each commodity separately, the rows are sorted 
+		# by station. A stable sort keeps the order of the commodities of a 
+		# station as it is in the file.
+		order = np.argsort(station_ids, kind = 'stable')
+		stations, first = np.unique(station_ids[order], return_index = True)
+		per_station = np.split(commodity_ids[order], first[1:])
+
+		for station_id, these in zip(stations.tolist(), per_station):
+			warez = [commodities[commodity_id] for commodity_id in these.tolist()]
+			self.data[station_id]['warez'] = warez
+
+
+	# For each rawdata file it is remembered when it was checked the last 
+	# time for a newer version and how the server identifies the version 
+	# (ETag and Last-Modified). These are stored in self.download_state_file.
+	def _load_download_state(self):
+		try:
+			with open(self.download_state_file, 'r', encoding = 'utf-8') as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
 
-			for line in f:
-				if self._fitting_commodity_parameters(line):
-					station_id = int(line.strip().split(',')[1])
-					commodity_id = int(line.strip().split(',')[2])
 
-					self.data[station_id]['warez'].append(commodities[commodity_id])
+	# Dito.
+	def _save_download_state(self):
+		with self.download_state_lock:
+			temporary = self.download_state_file + '.part'
+			with open(temporary, 'w', encoding = 'utf-8') as f:
+				json.dump(self.download_state, f, indent = 4, sort_keys = True)
+
+			os.replace(temporary, self.download_state_file)
 
 
 	# This method checks for a given < this_file > if it exists at all and
-	# if it exists if it is older than a day.
+	# if it exists if it was checked for a newer version within the last day.
 	# This method exists mainly to keep download_files() more tidy.
 	def _file_ok(self, this_file):
 		# First, check if the file exists.
 		if not os.path.isfile(this_file):
-			# Since a download will be triggered in download_files() if False 
-			# is returned, the database needs to be rebuild.
-			self.grab_data_from_raw = True
 			return False
 
-		# Second, check if the file is older than 23 hours.
-		# getmtime() gets the unix time when the file was created.
+		# Second, check if the last check is older than 23 hours. If the file 
+		# was never checked, the time it was modified is used.
 		# ATTENTION: The order of operations is important and I need two 
 		# separate if-conditions. The reason is that if the file doesn't exist
 		# checking how old it is would lead to errors.
-		if time() - os.path.getmtime(this_file) > 82800:
-			self.grab_data_from_raw = True
+		state = self.download_state.get(os.path.basename(this_file), {})
+		checked = state.get('checked', os.path.getmtime(this_file))
+
+		if time() - checked > 82800:
+			return False
+
+		return True
+
+
+	# After the download is complete the file may need to be decompressed. 
+	# If the content is the same as in the file I already have, the latter 
+	# is kept as it is. Otherwise the database would be build again for 
+	# nothing (see _cache_name()).
+	# < temporary > is the downloaded file and
+	# < encoding > how it is compressed.
+	# It returns True if the content has changed.
+	def _finish_download(self, this_file, temporary, encoding):
+		state = self.download_state[os.path.basename(this_file)]
+		new_file = this_file + '.new'
+		checksum = hashlib.sha1()
+
+		this_open = gzip.open if encoding == 'gzip' else open
+
+		with this_open(temporary, 'rb') as source, open(new_file, 'wb') as target:
+			while True:
+				chunk = source.read(self.download_chunk_size)
+				if not chunk:
+					break
+				checksum.update(chunk)
+				target.write(chunk)
+
+		os.remove(temporary)
+
+		unchanged = state.get('sha1') == checksum.hexdigest()
+		if unchanged and os.path.isfile(this_file):
+			os.remove(new_file)
 			return False
 
+		os.replace(new_file, this_file)
+		state['sha1'] = checksum.hexdigest()
+
 		return True
 
 
@@ -272,80 +569,436 @@ class DataGrabber(object):
 	# < this_file > is the path to where the file shall be stored.
 	# < url > is the url to the file of interest.
 	# < what > is a string that tells the user what's been downloaded.
-	def _do_the_download(self, this_file, url, what):
-		print("Downloading the {} file. This may take a while ...".format(what))
-		this = requests.get(url)
+	# < force_download > is True if the file shall be downloaded even if the 
+	# server says that it hasn't changed.
+	# It returns True if the content of the file has changed.
+	# 
+	# The file is NOT held in memory but written to disk piece by piece. 
+	# It gets its final name just when it is complete. Thus a broken download
+	# never replaces a good file. Instead, the download continues where it
+	# stopped the next time (if the server didn't get a newer version in the
+	# meantime).
+	def _do_the_download(self, this_file, url, what, force_download = False):
+		print("Checking the {} file. This may take a while ...".format(what))
+
+		state = self.download_state.setdefault(os.path.basename(this_file), {})
+		temporary = this_file + '.part'
+
+		# The files are much smaller if compressed. They are stored as they
+		# come and decompressed at the end. Otherwise the download could not 
+		# be continued since the server counts the compressed bytes.
+		headers = {'Accept-Encoding':'gzip'}
+
+		# The server answers just "not modified" if I have the newest version.
+		if os.path.isfile(this_file) and not force_download:
+			if state.get('etag'):
+				headers['If-None-Match'] = state['etag']
+			if state.get('last_modified'):
+				headers['If-Modified-Since'] = state['last_modified']
+
+		# The server sends just the missing part if the version I have a part
+		# of is still the newest version.
+		partial = state.get('partial', {})
+		resume_from = 0
+		validator = partial.get('etag') or partial.get('last_modified')
+		if validator and os.path.isfile(temporary):
+			resume_from = os.path.getsize(temporary)
+			headers['Range'] = 'bytes={}-'.format(resume_from)
+			headers['If-Range'] = validator
+
+		with requests.get(url, headers = headers, stream = True) as this:
+			if this.status_code == 304:
+				print("The {} file has not changed.".format(what))
+				state['checked'] = time()
+				self._save_download_state()
+				return False
+
+			# The part I have doesn't fit to what the server has. Start over.
+			if this.status_code == 416:
+				os.remove(temporary)
+				del state['partial']
+				return self._do_the_download(this_file, url, what, force_download)
+
+			this.raise_for_status()
+
+			content_range = this.headers.get('Content-Range', '')
+			resume = this.status_code == 206 and \
+						content_range.startswith('bytes {}-'.format(resume_from))
+
+			if this.status_code == 206 and not resume:
+				message = "Unexpected range {} for {}.".format(content_range, url)
+				raise requests.HTTPError(message)
+
+			if not resume:
+				partial = {'etag':this.headers.get('ETag'), \
+						'last_modified':this.headers.get('Last-Modified'), \
+						'encoding':this.headers.get('Content-Encoding')}
+
+			# This needs to be saved before the download starts. Otherwise it 
+			# would be lost if the download is interrupted.
+			state['partial'] = partial
+			self._save_download_state()
+
+			with open(temporary, 'ab' if resume else 'wb') as f:
+				for chunk in this.raw.stream(self.download_chunk_size, \
+													decode_content = False):
+					f.write(chunk)
+
+		changed = self._finish_download(this_file, temporary, partial['encoding'])
+
+		state['etag'] = partial['etag']
+		state['last_modified'] = partial['last_modified']
+		state['checked'] = time()
+		del state['partial']
+		self._save_download_state()
+
+		if changed:
+			print("Download of the {} file finished.".format(what))
+		else:
+			print("The {} file has not changed.".format(what))
 
-		# Save everything.
-		with open(this_file, 'wb') as f:
-			# < this > is NOT the file!
-			f.write(this.content)
+		return changed
 
 
 	# This method downloads the necessary files that are updated once per day.
 	# < force_download > is for the case that I want to force download the 
 	# files ... who would have thought that ;) .
+	# All downloads run at the same time. Thus it takes just as long as the 
+	# download of the largest file.
 	def download_files(self, force_download = False):
-		if not self._file_ok(self.systems_file) or force_download:
-			url = 'https://eddb.io/archive/v6/systems_populated.json'
-			self._do_the_download(self.systems_file, url, 'SYSTEMS')
+		files = [(self.systems_file, 'systems_populated.json', 'SYSTEMS'), \
+				(self.stations_file, 'stations.json', 'STATIONS'), \
+				(self.commodities_file, 'commodities.json', 'COMMODITIES'), \
+				(self.listings_file, 'listings.csv', 'LISTINGS')]
+
+		downloads = []
+		for this_file, name, what in files:
+			if not self._file_ok(this_file) or force_download:
+				url = self.download_url + name
+				downloads.append((this_file, url, what, force_download))
+
+		if not downloads:
+			return
+
+		with ThreadPoolExecutor(max_workers = len(downloads)) as executor:
+			running = [executor.submit(self._do_the_download, *this) \
+														for this in downloads]
+
+			# This raises an error if a download failed.
+			# The database needs to be build again just if something changed.
+			for this in running:
+				if this.result():
+					self.grab_data_from_raw = True
+
+
+	# A database is just valid for the parameters it was build with and the 
+	# rawdata it was build from. Thus each database gets a name that is 
+	# derived from all of these. The rawdata files are identified by their 
+	# size and the time they were last modified.
+	# < parameters > is a list with the parameters that matter.
+	def _cache_name(self, parameters):
+		parameters = list(parameters)
+
+		for this_file in (self.systems_file, self.stations_file, \
+							self.commodities_file, self.listings_file):
+			status = os.stat(this_file)
+			parameters.extend([status.st_size, status.st_mtime_ns])
+
+		return hashlib.sha1(repr(parameters).encode('utf-8')).hexdigest()
+
+
+	# The name of the database depends on all parameters ...
+	def _database_name(self):
+		parameters = [self.trader.start_system, self.trader.jumprange, \
+						self.trader.max_jumps, self.trader.padsize.lower(), \
+						self.trader.max_distance, self.trader.minimum_supply, \
+														'database', sd.VERSION]
+
+		return self._cache_name(parameters)
+
+
+	# ... while which stations are in range just depends on where I am and how
+	# far I'm willing to go.
+	def _region_name(self):
+		parameters = [self.trader.start_system, self.trader.jumprange, \
+														self.trader.max_jumps]
+
+		return 'region_' + self._cache_name(parameters)
+
+
+	# Going through the rawdata takes long. However, just if the home system,
+	# the jumprange or the maximum number of jumps change, other stations are 
+	# in range. Thus ALL stations in range and ALL their listings are 
+	# collected here. The other parameters are applied afterwards in 
+	# _find_relevant_stations() and _find_relevant_warez(). 
+	# It returns a dict with the stations, the listings (as station ids, 
+	# commodity ids and supplies) and the names of the commodities.
+	def _collect_region(self):
+		systems = self._load_system_coordinates()
+		self._find_home_coordinates(systems)
+		self._find_relevant_systems(systems)
+
+		stations = self._find_region_stations()
 
-		if not self._file_ok(self.stations_file) or force_download:
-			url = 'https://eddb.io/archive/v6/stations.json'
-			self._do_the_download(self.stations_file, url, 'STATIONS')
+		print("Reading the listings ...")
+		station_ids = [station['id'] for station in stations]
+		listings = self._read_listings(station_ids)
 
-		if not self._file_ok(self.commodities_file) or force_download:
-			url = 'https://eddb.io/archive/v6/commodities.json'
-			self._do_the_download(self.commodities_file, url, 'COMMODITIES')
+		return {'stations':stations, 'listings':listings, \
+										'commodities':self._get_commodities()}
 
-		if not self._file_ok(self.listings_file) or force_download:
-			url = 'https://eddb.io/archive/v6/listings.csv'
-			self._do_the_download(self.listings_file, url, 'LISTINGS')
+
+	# The stations in range are stored, too. Thus the rawdata needs to be read 
+	# just if the range changes.
+	# < rebuild > is True if the stored stations shall NOT be used.
+	def _load_region(self, rebuild):
+		region_file = os.path.join(self.data_directory, self._region_name())
+
+		if self.grab_data_from_raw or rebuild or not os.path.isfile(region_file):
+			region = self._collect_region()
+
+			with open(region_file, 'wb') as f:
+				pickle.dump(region, f)
+		else:
+			with open(region_file, 'rb') as f:
+				region = pickle.load(f)
+
+			os.utime(region_file)
+
+		return region, region_file
+
+
+	# This method deletes the least recently used databases (and stored 
+	# stations in range) if all of them together need more space than 
+	# self.cache_size.
+	# < keep > are the files that were just used. These are never deleted.
+	def _remove_old_databases(self, keep):
+		databases = []
+		for name in os.listdir(self.data_directory):
+			this_file = os.path.join(self.data_directory, name)
+			status = os.stat(this_file)
+			databases.append((status.st_mtime, status.st_size, this_file))
+
+		total = sum([size for _, size, _ in databases])
+
+		# Oldest first.
+		for _, size, this_file in sorted(databases):
+			if total <= self.cache_size:
+				break
+
+			if this_file in keep:
+				continue
+
+			os.remove(this_file)
+			total -= size
 
 
 	# This method get's all the relevant data from the rawdata.
 	# < rebuild > is for the case that the database shall be rebuild manually
-	# e.g., with the same files but with changed parameters. 
+	# e.g., with the same files. 
 	def build_database(self, rebuild = False):
-		# In case the database-file doesn't exist, this is caught in _file_ok()
-		# and there self.grab_data_from_raw is set to True.
-		self._file_ok(self.data_file)
-
-		if self.grab_data_from_raw or rebuild:
-			self._find_home_coordinates()
-			self._find_relevant_systems()
-			self._find_relevant_stations()
-			self._find_relevant_warez()
-
-			# When all is done, save the data.
-			with open(self.data_file, 'wb') as f:
-				pickle.dump(self.data, f)
-
-		# In case that the data is fresh and I just do a rerun it is much less 
-		# time consuming to open the file that contains the correct data for 
-		# the given rawdata.
+		# Older versions stored just one database in a file with the name of 
+		# the directory.
+		if os.path.isfile(self.data_directory):
+			os.remove(self.data_directory)
+
+		if not os.path.isdir(self.data_directory):
+			os.makedirs(self.data_directory)
+
+		self.data_file = os.path.join(self.data_directory, self._database_name())
+
+		keep = [self.data_file]
+
+		if self.grab_data_from_raw or rebuild or not os.path.isfile(self.data_file):
+			self.data = {}
+
+			region, region_file = self._load_region(rebuild)
+			keep.append(region_file)
+
+			self._find_relevant_stations(region)
+			self._find_relevant_warez(region)
+
+			# When all is done, save the data. All commodities are stored, too.
+			# update_market() may need them.
+			sd.write_database(self.data_file, self.data, \
+											region['commodities'].values())
+
+			# The new database contains none of the market updates. Thus 
+			# all of them need to be read again.
+			positions = self._load_feed_positions()
+			positions.pop(os.path.basename(self.data_file), None)
+			self._save_feed_positions(positions)
+
+		# In case that a database for these parameters and this rawdata 
+		# exists, it is much less time consuming to open the file that 
+		# contains the correct data.
 		else:
-			with open(self.data_file, 'rb') as f:
-				self.data = pickle.load(f)
+			# The modification time tells which database was used last.
+			os.utime(self.data_file)
+
+		# Either way, the database is used directly from the file. See 
+		# class_stationdatabase.py for why.
+		self.data = sd.StationDatabase(self.data_file)
+
+		self._remove_old_databases(keep)
+
+		# Updates are applied after the database was (maybe) build again. 
+		# Otherwise a new database would lack them.
+		if self.trader.market_updates:
+			self.update_market(self.trader.market_updates)
+
+
+	# Prices and supply change all day. Instead of downloading the whole 
+	# listings file again, updates for single stations can be read from 
+	# < source >. This is either a file or "host:port" of a local server. 
+	# Either way, each line is one update in JSON like this:
+	# {"station_id": 42, "timestamp": 1550000000, 
+	#  "listings": [{"commodity_id": 5, "supply": 1234}, ...]}
+	# "listings" are ALL commodities that are now available at the station. 
+	# "timestamp" (unix time) is optional.
+	# 
+	# Of a file just the lines that were added since the last call are read.
+	# How far the file was read is stored in self.market_feed_file for each
+	# database.
+	# This generator yields each update as a dict.
+	def _read_market_updates(self, source):
+		if not os.path.isfile(source):
+			host, port = self._market_server(source)
+
+			with socket.create_connection((host, port)) as connection:
+				with connection.makefile('rb') as f:
+					for line in f:
+						if line.strip():
+							yield json.loads(line.decode('utf-8'))
+			return
+
+		positions = self._load_feed_positions()
+
+		database = os.path.basename(self.data_file)
+		feed = os.path.abspath(source)
+		position = positions.get(database, {}).get(feed, 0)
+
+		with open(source, 'rb') as f:
+			f.seek(position)
+
+			for line in f:
+				# The last line may still be written.
+				if not line.endswith(b'\n'):
+					break
+
+				position += len(line)
+
+				if line.strip():
+					yield json.loads(line.decode('utf-8'))
+
+		positions.setdefault(database, {})[feed] = position
+		self._save_feed_positions(positions)
+
+
+	# How far each market updates file was read for each database (see 
+	# _read_market_updates()). Databases that don't exist anymore are 
+	# forgotten.
+	def _load_feed_positions(self):
+		try:
+			with open(self.market_feed_file, 'r', encoding = 'utf-8') as f:
+				positions = json.load(f)
+		except (OSError, ValueError):
+			positions = {}
+
+		return {name:this for name, this in positions.items() if \
+					os.path.isfile(os.path.join(self.data_directory, name))}
+
+
+	# Dito.
+	def _save_feed_positions(self, positions):
+		with open(self.market_feed_file, 'w', encoding = 'utf-8') as f:
+			json.dump(positions, f, indent = 4, sort_keys = True)
+
+
+	# This method returns host and port if < source > is "host:port". If it
+	# is neither that nor an existing file, the user is told so (e.g., a 
+	# mistyped file name) instead of getting a cryptic error.
+	def _market_server(self, source):
+		host, _, port = source.rpartition(':')
+
+		if not host or not port.isdigit():
+			this = "The market updates source < {} > is neither ".format(source)
+			that = 'an existing file nor "host:port".'
+			raise ValueError(this + that)
+
+		return host, int(port)
+
+
+	# This method reads the updates from < source > (see 
+	# _read_market_updates()) and replaces the commodities of the updated 
+	# stations in the database. Just the updated stations are written (see 
+	# class_stationdatabase.py).
+	def update_market(self, source):
+		print("Reading market updates ...")
+
+		commodities = self._get_commodities()
+		# Updates that are older than the listings file are already in there.
+		oldest = os.path.getmtime(self.listings_file)
+
+		changes = {}
+		for update in self._read_market_updates(source):
+			if update.get('timestamp', oldest + 1) <= oldest:
+				continue
+
+			station_id = update['station_id']
+			if station_id not in self.data:
+				continue
+
+			# The same conditions as in _fitting_commodity_parameters() apply.
+			warez = []
+			for listing in update['listings']:
+				enough = listing['supply'] >= self.trader.minimum_supply
+				if enough and listing['commodity_id'] in commodities:
+					warez.append(commodities[listing['commodity_id']])
+
+			# A later update for the same station replaces an earlier.
+			changes[station_id] = warez
+
+		sd.update_warez(self.data_file, changes)
+		self.data = sd.StationDatabase(self.data_file)
+
+		print("Updated {} station(s).".format(len(changes)))
 
 
 	# It is handy to be able to check if a commodity is available at the
 	# relevant stations BEFORE a trading mission is accepted. Thus, this 
 	# method exists to check exactly that.
-	def find_commodity(self, commodity):
-		for station_id, information in self.data.items():
-			# The available commodities are upper case. However, it may be 
-			# beneficial if I account for lower case input.
-			warez = [x.lower() for x in information['warez']]
-
-			if commodity.lower() in warez:
-				print('\n{} is available.\n'.format(commodity))
-				# I just want to know if it is available at all. For that just
-				# one station that has the commodity in question needs to be 
-				# found.
-				return
-
-		print('\n{} is NOT available.\n'.format(commodity))
+	# < commodities > is a list with the names of the commodities. For each 
+	# the best stations that have it are shown.
+	def find_commodity(self, commodities):
+		# Just one commodity works, too.
+		if isinstance(commodities, str):
+			commodities = [commodities]
+
+		for commodity in commodities:
+			station_ids = self.data.stations_with(commodity)
+
+			if not station_ids:
+				print('\n{} is NOT available.\n'.format(commodity))
+				continue
+
+			this = '\n{} is available at {} station(s). The best ones are:'
+			print(this.format(commodity, len(station_ids)))
+
+			# The index has the best stations first (NON-planetary, close to 
+			# the point of entry).
+			for station_id in station_ids[:self.stations_shown]:
+				information = self.data[station_id]
+				distance = information['distance']
+				distance = '?' if distance is None else round(distance)
+				print('    {} in {} ({} ls, {})'.format(information['name'], \
+							information['system'], distance, information['type']))
+
+			if len(station_ids) > self.stations_shown:
+				print('    ... and {} more.'.format(len(station_ids) - \
+														self.stations_shown))
+
+		print()
 
 
 
@@ -0,0 +1,212 @@
+#    "class_listingsscanner" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file contains the class definition for the object that reads the
+# listings csv-file for class DataGrabber().
+#
+# The listings file has millions of rows but just a few of them belong to
+# relevant stations. Thus the file is NOT decoded at all. Instead, its raw
+# bytes are memory-mapped and scanned block by block with numpy. Of each row
+# just the station id is converted into an integer. Just if the station is
+# relevant the commodity id and the supply are converted, too.
+
+import mmap
+import numpy as np
+
+
+# ASCII codes of the characters that matter.
+NEWLINE = ord('\n')
+CARRIAGE_RETURN = ord('\r')
+COMMA = ord(',')
+MINUS = ord('-')
+ZERO = ord('0')
+
+
+class ListingsScanner(object):
+	# < listings_file > is the path to the listings csv-file.
+	# < columns > are the positions of the station id, commodity id and
+	# supply in a row (see DataGrabber._listings_columns()).
+	# < relevant > are the ids of the relevant stations.
+	# < block_size > is roughly how many bytes are scanned at once.
+	def __init__(self, listings_file, columns, relevant, block_size = 16777216):
+		self.listings_file = listings_file
+		self.columns = columns
+		self.relevant = np.unique(np.asarray(list(relevant), dtype = 'i8'))
+		self.block_size = block_size
+
+
+	# This method finds where the field in the < column >-th column of each
+	# row starts and ends.
+	# < block > is the numpy view on the bytes of whole rows.
+	# < starts > and < ends > are the positions where the rows start and end.
+	# < commas > are the positions of all commas in < block >.
+	# It returns the start and end of the field for each row and a boolean
+	# array that is False for rows that don't have that many columns.
+	def _field_bounds(self, block, starts, ends, commas, column):
+		ok = np.ones(len(starts), dtype = bool)
+
+		if not len(commas):
+			commas = np.array([len(block)], dtype = 'i8')
+
+		last = len(commas) - 1
+		first_comma = np.searchsorted(commas, starts)
+
+		if column == 0:
+			field_starts = starts.copy()
+		else:
+			before = first_comma + column - 1
+			ok &= before <= last
+			comma = commas[np.minimum(before, last)]
+			ok &= comma < ends
+			field_starts = comma + 1
+
+		after = first_comma + column
+		comma = commas[np.minimum(after, last)]
+		has_comma = (after <= last) & (comma < ends)
+		field_ends = np.where(has_comma, comma, ends)
+
+		# Windows line endings.
+		ok &= field_ends > field_starts
+		previous = block[np.maximum(field_ends - 1, 0)]
+		field_ends -= ok & (previous == CARRIAGE_RETURN)
+
+		return field_starts, field_ends, ok
+
+
+	# This method converts the digits between < field_starts > and
+	# < field_ends > into integers. All rows at once, digit by digit.
+	# It returns the integers and a boolean array that is False if a field
+	# is not an integer.
+	def _parse_integers(self, block, field_starts, field_ends, ok):
+		negative = ok & (block[np.minimum(field_starts, len(block) - 1)] == MINUS)
+		field_starts = field_starts + negative
+
+		lengths = field_ends - field_starts
+		# An int64 has at most 18 digits that can be used safely.
+		ok = ok & (lengths > 0) & (lengths <= 18)
+		lengths = np.where(ok, lengths, 0)
+
+		values = np.zeros(len(field_starts), dtype = 'i8')
+		if not ok.any():
+			return values, ok
+
+		for i in range(int(lengths.max())):
+			inside = i < lengths
+			digits = block[np.where(inside, field_starts + i, 0)].astype('i8') - ZERO
+			ok &= ~inside | ((digits >= 0) & (digits <= 9))
+			values = np.where(inside, values * 10 + digits, values)
+
+		return np.where(negative, -values, values), ok
+
+
+	# This method scans one block of whole rows.
+	# It returns the station ids, commodity ids and supplies of the rows of
+	# relevant stations.
+	def _scan_block(self, block):
+		station_column, commodity_column, supply_column = self.columns
+
+		ends = np.flatnonzero(block == NEWLINE)
+		# The last row of the file may not end with a newline.
+		if not len(ends) or ends[-1] != len(block) - 1:
+			ends = np.append(ends, len(block))
+		starts = np.concatenate(([0], ends[:-1] + 1))
+
+		commas = np.flatnonzero(block == COMMA)
+
+		bounds = self._field_bounds(block, starts, ends, commas, station_column)
+		station_ids, ok = self._parse_integers(block, *bounds)
+
+		# All other rows are thrown away BEFORE anything else is converted.
+		keep = ok & np.isin(station_ids, self.relevant)
+		starts = starts[keep]
+		ends = ends[keep]
+		station_ids = station_ids[keep]
+
+		bounds = self._field_bounds(block, starts, ends, commas, commodity_column)
+		commodity_ids, commodity_ok = self._parse_integers(block, *bounds)
+
+		bounds = self._field_bounds(block, starts, ends, commas, supply_column)
+		supplies, supply_ok = self._parse_integers(block, *bounds)
+
+		ok = commodity_ok & supply_ok
+
+		return station_ids[ok], commodity_ids[ok], supplies[ok]
+
+
+	# The file can be scanned in several parts at the same time (e.g., in 
+	# different processes). This method splits the part of the file between
+	# < start > and < end > (in bytes) into < parts > ranges of roughly equal 
+	# size. Each range starts at the beginning of a row.
+	# It returns a list with (start, end) tuples.
+	def split(self, start, end, parts):
+		with open(self.listings_file, 'rb') as f:
+			end = min(end, f.seek(0, 2))
+			borders = [start]
+
+			for i in range(1, parts):
+				position = max(start + (end - start) * i // parts, borders[-1])
+				# Move to the beginning of the next row (if not already there).
+				if position > start:
+					f.seek(position - 1)
+					f.readline()
+					position = f.tell()
+				borders.append(min(position, end))
+
+		borders.append(end)
+
+		return [(a, b) for a, b in zip(borders[:-1], borders[1:]) if a < b]
+
+
+	# This method scans the listings file between the positions < start >
+	# and < end > (in bytes). < start > needs to be the beginning of a row.
+	# It returns the station ids, commodity ids and supplies of all rows of
+	# relevant stations as numpy arrays in the order of the file.
+	def scan(self, start, end):
+		found = [[], [], []]
+
+		with open(self.listings_file, 'rb') as f:
+			size = min(end, f.seek(0, 2))
+			if start < size:
+				mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+				position = start
+
+				while position < size:
+					block_end = min(position + self.block_size, size)
+
+					# A block shall contain just whole rows.
+					if block_end < size:
+						newline = mm.rfind(b'\n', position, block_end)
+						if newline == -1:
+							newline = mm.find(b'\n', block_end, size)
+						block_end = size if newline == -1 else newline + 1
+
+					# No copy! It's a view on the memory-mapped file.
+					block = np.frombuffer(mm, dtype = np.uint8, \
+								count = block_end - position, offset = position)
+
+					for i, this in enumerate(self._scan_block(block)):
+						found[i].append(this)
+
+					position = block_end
+
+				# The file can't be closed as long as a view exists.
+				del block
+				mm.close()
+
+		return [np.concatenate(this) if this else np.zeros(0, dtype = 'i8') \
+															for this in found]
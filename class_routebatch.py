@@ -0,0 +1,246 @@
+#    "class_routebatch" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file contains the class definition for the object that flies many
+# routes at once.
+#
+# class RouteState() flies one route after the other, location by location
+# and commodity by commodity in Python. Here the same is done with numpy for
+# thousands of routes at the same time: each route is one row and each step
+# (selling or buying one commodity at the next location) is done for all
+# rows at once. Thus the time per route is just a small part of the time
+# RouteState.fly() needs.
+#
+# ATTENTION: Buying and selling here MUST do exactly the same as
+# RouteState.visit()!
+
+import numpy as np
+
+
+class RouteBatch(object):
+	# If a best score is given to evaluate(), it is checked after every this
+	# many locations which routes can't be better anymore. Checking takes 
+	# about as long as flying to a location. Thus not after every location.
+	bound_every = 3
+
+	# < state > is the class RouteState() instance the missions are taken
+	# from. It is NOT changed. Routes start from the situation < state > is
+	# in when this object is created (see evaluate() for how to start
+	# somewhere else).
+	def __init__(self, state):
+		stops = len(state.sells)
+		wares = len(state.needed_quantity)
+		most_sells = max([len(sells) for sells in state.sells] + [0])
+
+		# What can be sold at each stop (the same stops as in state.sells,
+		# thus the origin is included if there is one). One row per stop,
+		# one column per mission there. Stops with fewer missions have -1 as
+		# mission (and 0 as ware and quantity) in the remaining columns.
+		self.sell_mission = np.full((stops, most_sells), -1, dtype = 'i8')
+		self.sell_ware = np.zeros((stops, most_sells), dtype = 'i8')
+		self.sell_quantity = np.zeros((stops, most_sells), dtype = 'i8')
+		for stop, sells in enumerate(state.sells):
+			for i, (mission, ware, quantity) in enumerate(sells):
+				self.sell_mission[stop, i] = mission
+				self.sell_ware[stop, i] = ware
+				self.sell_quantity[stop, i] = quantity
+
+		# Which commodities can be bought at each stop.
+		self.available = np.zeros((stops, wares), dtype = bool)
+		for stop, buys in enumerate(state.buys):
+			self.available[stop, buys] = True
+
+		# How much of a commodity needs to be bought (wholesale!).
+		self.needed_quantity = np.array(state.needed_quantity, dtype = 'i8')
+		# Commodities are bought in this order (the same as in
+		# RouteState.visit()).
+		self.wanted = sorted(set(ware for buys in state.buys for ware in buys))
+
+		# For the bound in evaluate() (see RouteState.bound()): the station
+		# (the position in state.locations, -1 if at none), the ware and the
+		# quantity of each mission ...
+		self.missions = len(state._missions)
+		self.mission_stop = np.array(state._mission_location, dtype = 'i8')
+		self.mission_ware = np.array([ware for ware, _ in state._missions], \
+																dtype = 'i8')
+		self.mission_quantity = np.array([quantity for _, quantity in \
+												state._missions], dtype = 'i8')
+		# ... at which locations a commodity can be bought (not if it needs 
+		# more space than the whole cargo bay has) ...
+		locations = len(state.locations)
+		self.bought_at = np.array([[bought_at >> stop & 1 for bought_at in \
+					state._bought_at] for stop in range(locations)], \
+					dtype = bool).reshape(locations, wares)
+		# ... and if the ware of a mission can be bought at its station.
+		self.bought_here = np.zeros(self.missions, dtype = bool)
+		has_stop = self.mission_stop >= 0
+		self.bought_here[has_stop] = self.bought_at[ \
+			self.mission_stop[has_stop], self.mission_ware[has_stop]]
+
+		self.start = self.situation(state)
+
+
+	# This method returns the situation < state > is in as arrays: how much
+	# of each commodity is in the cargo bay, the free cargo space, which
+	# missions are still open and which commodities still need to be bought.
+	def situation(self, state):
+		wares = len(state.needed_quantity)
+
+		quantity = np.array(state.quantity, dtype = 'i8')
+		open_missions = np.array([state.open_missions >> mission & 1 \
+							for mission in range(self.missions)], dtype = bool)
+		needed = np.array([state.needed >> ware & 1 \
+									for ware in range(wares)], dtype = bool)
+
+		return quantity, state.free_cargo, open_missions, needed
+
+
+	# This method flies all < routes > (a 2-D array with one route per row,
+	# each a list of positions in RouteState.locations) and returns two
+	# arrays: the number of missions that stay open and the number of
+	# commodities that still need to be bought for each route (see
+	# RouteState.score()).
+	# < situation > is where all routes start (see situation()). None means
+	# where the RouteState() was when this object was created.
+	# If < best > (a score) is given, routes that can't be better than that
+	# anymore are not flown any further (see _bound()). For 
+	# these the score that is returned may be too good but it is NEVER 
+	# better than < best >.
+	def evaluate(self, routes, situation = None, best = None):
+		routes = np.asarray(routes, dtype = 'i8')
+		quantity, free_cargo, open_missions, needed = situation or self.start
+
+		batch = len(routes)
+		quantity = np.tile(quantity, (batch, 1))
+		free_cargo = np.full(batch, free_cargo, dtype = 'i8')
+		open_missions = np.tile(open_missions, (batch, 1))
+		needed = np.tile(needed, (batch, 1))
+
+		remaining_missions = open_missions.sum(axis = 1)
+		needed_count = needed.sum(axis = 1)
+		# The scores of all routes (in the same order as < routes >).
+		scores = (np.zeros(batch, dtype = 'i8'), np.zeros(batch, dtype = 'i8'))
+		# Which rows of < routes > are still flown.
+		flown = np.arange(batch)
+
+		if best is not None:
+			# Which locations are still ahead and at how many of these each 
+			# commodity can be bought.
+			ahead = np.zeros((batch, len(self.bought_at)), dtype = bool)
+			ahead[np.arange(batch)[:, np.newaxis], routes] = True
+			bought_ahead = self.bought_at[routes].sum(axis = 1)
+
+		for step in range(routes.shape[1]):
+			stops = routes[:, step]
+			rows = np.arange(len(stops))
+
+			# Like in RouteState.visit(): first everything is sold ...
+			for i in range(self.sell_mission.shape[1]):
+				mission = self.sell_mission[stops, i]
+				ware = self.sell_ware[stops, i]
+				this_quantity = self.sell_quantity[stops, i]
+
+				# Don't sell anything if not enough of this commodity is in
+				# the cargo bay.
+				sold = (mission >= 0) & open_missions[rows, mission] & \
+									(this_quantity <= quantity[rows, ware])
+				sold_quantity = np.where(sold, this_quantity, 0)
+
+				open_missions[rows[sold], mission[sold]] = False
+				quantity[rows, ware] -= sold_quantity
+				free_cargo += sold_quantity
+				remaining_missions -= sold
+
+			# ... and then bought.
+			available = self.available[stops]
+			for ware in self.wanted:
+				needed_quantity = self.needed_quantity[ware]
+				# Yes, this condition means that I buy just wholesale.
+				bought = available[:, ware] & needed[:, ware] & \
+												(free_cargo >= needed_quantity)
+				bought_quantity = np.where(bought, needed_quantity, 0)
+
+				needed[:, ware] &= ~bought
+				quantity[:, ware] += bought_quantity
+				free_cargo -= bought_quantity
+				needed_count -= bought
+
+			if best is None:
+				continue
+
+			ahead[rows, stops] = False
+			bought_ahead -= self.bought_at[stops]
+
+			if step % self.bound_every != self.bound_every - 1:
+				continue
+
+			open_for_sure, needed_for_sure = \
+							self._bound(open_missions, quantity, needed, \
+												ahead, bought_ahead)
+
+			beaten = (open_for_sure > best[0]) | (needed_for_sure > best[1]) | \
+					((open_for_sure == best[0]) & (needed_for_sure == best[1]))
+			if not beaten.any():
+				continue
+
+			# The routes that can't be better anymore get the score they 
+			# have for sure and are not flown any further.
+			scores[0][flown[beaten]] = open_for_sure[beaten]
+			scores[1][flown[beaten]] = needed_for_sure[beaten]
+
+			kept = ~beaten
+			flown = flown[kept]
+			routes = routes[kept]
+			quantity = quantity[kept]
+			free_cargo = free_cargo[kept]
+			open_missions = open_missions[kept]
+			needed = needed[kept]
+			remaining_missions = remaining_missions[kept]
+			needed_count = needed_count[kept]
+			ahead = ahead[kept]
+			bought_ahead = bought_ahead[kept]
+
+			if not len(flown):
+				break
+
+		scores[0][flown] = remaining_missions
+		scores[1][flown] = needed_count
+
+		return scores
+
+
+	# This method does the same as RouteState.bound() for all rows at once.
+	# < ahead > tells which locations are still to be visited and 
+	# < bought_ahead > at how many of these each commodity can be bought.
+	def _bound(self, open_missions, quantity, needed, ahead, bought_ahead):
+		ware = self.mission_ware
+		has_stop = self.mission_stop >= 0
+		stop_ahead = ahead[:, np.where(has_stop, self.mission_stop, 0)] & \
+																	has_stop
+
+		# How much of the commodity can be in the cargo bay at most when I 
+		# get to the station of a mission.
+		elsewhere = bought_ahead[:, ware] > self.bought_here
+		most = quantity[:, ware] + np.where(needed[:, ware] & elsewhere, \
+												self.needed_quantity[ware], 0)
+		stays_open = open_missions & \
+					(~stop_ahead | (self.mission_quantity > most))
+
+		still_needed = needed & (bought_ahead == 0)
+
+		return stays_open.sum(axis = 1), still_needed.sum(axis = 1)
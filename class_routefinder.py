@@ -23,16 +23,68 @@
 from itertools import permutations
 from copy import deepcopy
 from math import factorial
-import random
+from time import time
+import multiprocessing
+import numpy as np
+import class_routestate as cr
+import class_routebatch as cb
+import class_routeimprover as ci
 
 
 # The object that contains all methods that are necessary to determine a
 # route.
 class RouteFinder(object):
+	# Up to this many locations (or as many routes as there are for this 
+	# many locations, see RouteState.before) all possible routes are 
+	# searched (see _search_all_routes()). With more locations, ...
+	exact_search_limit = 15
+
+	# ... this many routes are tried (if no time limit is given). Either by 
+	# improving a route step by step ('improve', see _improve_routes()) or 
+	# by trying random routes ('shuffle', see _compute_random_routes()).
+	heuristic = 'improve'
+	heuristic_routes = 400023
+	# For the random numbers of both. None means that they are different 
+	# every time.
+	seed = None
+
+	# If this many locations (or fewer) are left, _search_all_routes() flies 
+	# all orders of them at once (see class RouteBatch()). It's off since 
+	# the bound and the situations already seen usually skip so many of 
+	# these orders that flying the rest one by one is faster.
+	batch_tail = 0
+	# Random routes are flown this many at once.
+	batch_routes = 4096
+
+	# With fewer locations than this, splitting the search between several
+	# processes doesn't pay off (see _search_in_parallel()).
+	parallel_minimum = 10
+
 	# < trader > is the class Trader() instance that contains the information
 	# necessary to calculate the route.
-	def __init__(self, trader):
+	# < engine > is how all possible routes are searched: 'search' (see 
+	# _search_all_routes()) or 'dp' (see _solve_all_routes()).
+	# < time_limit > is after how many seconds the search stops and the best
+	# route so far is taken. None means that there is no limit.
+	# < find_route > is if the best route shall be found right away. If not,
+	# better_routes() can be used to get each better route when it is found.
+	# < heuristic > is how routes are searched if there are too many to 
+	# search all of them (see self.heuristic, which is used if None).
+	def __init__(self, trader, engine = 'search', time_limit = None, \
+										find_route = True, heuristic = None):
 		print("Initiating route finder ...")
+		self.engine = engine
+		if heuristic is not None:
+			self.heuristic = heuristic
+		self.time_limit = time_limit
+		# When the search stops (see better_routes()).
+		self.deadline = float('inf')
+		# How many processes may search at the same time.
+		self.workers = trader.workers
+		# If several processes search at the same time, the score of the 
+		# best route so far is in shared memory (see _load_best()).
+		self.shared_best = None
+		self.shared_lock = None
 		# Many routes exist that are not optimal. Since I don't know beforehand 
 		# what's a good route and what's not a good route I need to check all 
 		# possible permutations of station ordering.
@@ -41,31 +93,37 @@ class RouteFinder(object):
 		self.original_trader = trader
 		# All methods work with this object, NOT the self.original_trader!
 		self.trader = deepcopy(self.original_trader)
-		# This will be set in _permutate_locations() and it will contain 
-		# simplified information about the locations that need to be visited.
-		self.location_permutations = None
+		# Routes are NOT flown with a copy of the trader but with this (see 
+		# class RouteState() for why). It also contains simplified 
+		# information about the locations that need to be visited. A route is
+		# a list of positions in self.state.locations.
+		self.state = cr.RouteState(self.trader)
+		# Flies many routes at once.
+		self.batch = cb.RouteBatch(self.state)
 		# This acts as a temporary storage to determine the best route.
 		# In the best case it equals zero after all possible routes where 
 		# tried.
 		self.best_remaining_missions = self._count_missions()
+		# Dito for the number of commodities that still need to be bought ...
+		self.best_needed_commodities = len(self.trader.needed_commodities)
+		# ... and the best route itself.
+		self.best_route = None
 		# This acts as a temporary storage for information the user needs to
-		# know while each route is checked. If it turns out that this route
-		# is the best (so far), this will be more permanentely stored ...
+		# know while the best route is flown (see _fly_best_route()) ...
 		self.messages = []
-		# ... in here and presented at the end to the user.
+		# ... and in here it is presented at the end to the user.
 		self.best_run_messages = []
-		# If a good (but not yet optimal) route was found, the information
-		# is stored in here in _fly_this_route() so that the good route can 
-		# be compared to find an even better route.
+		# This is the trader after the best route was flown.
 		self.best_trader = deepcopy(self.original_trader)
 		# This is simplified information about the location where I start so 
 		# that I can access it easier in several places below.
 		self.origin_location = (trader.start_system, trader.start_station, \
 														trader.start_commodities)
 
-		self._permutate_locations()
+		self._show_origin()
 
-		self._find_route()
+		if find_route:
+			self._find_route()
 
 
 	# Each commodity that needs to be delivered to a specific station is seen
@@ -82,20 +140,11 @@ class RouteFinder(object):
 		return counter
 
 
-	# This mehtod simplifies the information that one needs to know for 
-	# each location and than generates all permutations for all locations.
-	def _permutate_locations(self):
-		simplified_locations = []
-
-		for system, stations in self.trader.locations.items():
-			for station, commodities in stations.items():
-				simplified_locations.append((system, station, commodities))
-
-		self.location_permutations = permutations(simplified_locations)
-
-		# I didn't know where else to put this.
+	# The user is told where the route starts.
+	def _show_origin(self):
 		print("\nYOU ARE AT:", self.origin_location[1], "in", self.origin_location[0])
-		print("Here you can find:", list(self.origin_location[2]))
+		here = self.trader.commodities.names(self.origin_location[2])
+		print("Here you can find:", here)
 		print("It will be checked if something can already be bought here.\n")
 
 
@@ -140,7 +189,7 @@ class RouteFinder(object):
 	# More or less the same like _sell_at_location() just for buying a 
 	# commodity.
 	# < location > is a tuple with the system-name, station-name and available
-	# commodities.
+	# commodities (as bitset, see class SymbolTable()).
 	def _buy_at_location(self, location):
 		system = location[0]
 		station = location[1]
@@ -155,7 +204,7 @@ class RouteFinder(object):
 				quantity_needed = self.trader.needed_commodities[commodity]
 				# Yes, this condition means that I buy just wholesale.
 				enough_space = self.trader.free_cargo >= quantity_needed
-				is_available = commodity in commodities
+				is_available = commodities >> ware.id & 1
 			else:
 				enough_space = False
 				is_available = False
@@ -173,43 +222,37 @@ class RouteFinder(object):
 				del self.trader.needed_commodities[commodity]
 
 
-	# This method basically does the selling / buying for each location in a 
-	# given permutation of locations and checks if this route is better than 
-	# the so far best route.
-	# This method exists mainly to keep _compute_all_permutations() and 
-	# _compute_random_routes() more tidy.
-	# < locations > is a given order of locations to visit.
-	def _fly_this_route(self, locations):
-		# First I need to deepcopy the original information so that it is 
-		# available for the next permutation!
-		self.trader = deepcopy(self.original_trader)
+	# This method checks if < locations > is one of the routes that need to 
+	# be looked at (see RouteState.before). < locations > may also be just
+	# how a route starts.
+	# < not_visited > is a bitset of the locations that are left before 
+	# < locations > (all locations if None).
+	def _is_canonical(self, locations, not_visited = None):
+		if not_visited is None:
+			not_visited = (1 << len(self.state.locations)) - 1
 
-		# It doesn't hurt to check if there is something to be bought at the 
-		# origin location. One never knows!
-		# 
-		# I need to do this here (and thus every time and for each permutation)
-		# instead of in _find_route() before I compute the route(s) because 
-		# _sell_at_location() and _buy_at_location() operate on self.trader.
-		# however, self.trader will for each permutation be written over with 
-		# the original information. 
-		# I could change the original information after the origin location 
-		# was checked BUT there is a point why the original information is
-		# stored ... I'm also too lazy to do that and since the routes are 
-		# found rather fast despite these additional operations am I not 
-		# having any incentive to do so.
-		# 
-		# An origin location may not have been declared by the user.
-		if self.origin_location[0]:
-			self._sell_at_location(self.origin_location)
-			self._buy_at_location(self.origin_location)
+		for stop in locations:
+			if not self._may_go_to(stop, not_visited):
+				return False
 
-		# Do the same for each location in the given permutation of locations.
-		for location in locations:
-			self._sell_at_location(location)
-			self._buy_at_location(location)
+			not_visited &= ~(1 << stop)
 
-		remaining_missions = self._count_missions()
+		return True
 
+
+	# This method checks if the location < stop > may be visited next if the
+	# locations in < not_visited > (a bitset) are left. It may not if a 
+	# location that is the same as < stop > (see RouteState.before) would
+	# then be visited later. All routes that do so lead to the same result 
+	# as a route that doesn't.
+	def _may_go_to(self, stop, not_visited):
+		return not not_visited & self.state.before[stop]
+
+
+	# This method checks if a route that leaves < remaining_missions > open
+	# and still needs < needed_commodities > to be bought is better than the
+	# so far best route.
+	def _is_better(self, remaining_missions, needed_commodities):
 		# If less missions remain after being once at every station 
 		# that is a sign for a better route. However ...
 		first = remaining_missions < self.best_remaining_missions
@@ -225,143 +268,870 @@ class RouteFinder(object):
 		# from the commodity everybody wants).
 		# Hence, the second condition that the number of things that still have 
 		# to be picked up needs to be at least equal to the previous route.
-		second = len(self.trader.needed_commodities) <= len(self.best_trader.needed_commodities)
+		second = needed_commodities <= self.best_needed_commodities
 
 		# This is a variation of the above two conditions. However, it can't
 		# be caught in the above.
 		third = remaining_missions == self.best_remaining_missions
-		fourth = len(self.trader.needed_commodities) < len(self.best_trader.needed_commodities)
+		fourth = needed_commodities < self.best_needed_commodities
+
+		return (first and second) or (third and fourth)
+
+
+	# This method returns True if there is no point in searching any longer:
+	# either a route was found that leaves no mission open or the time is up.
+	def _should_stop(self):
+		return self.best_remaining_missions == 0 or time() > self.deadline
+
+
+	# Before any search starts, a first route is build location by location. 
+	# Always the location is taken that leaves the fewest missions open (and 
+	# of these the one after which the fewest commodities still need to be 
+	# bought). If that is the same for several locations, the one with the 
+	# fewest of its own missions left open is taken since it makes no sense 
+	# to go to a mission station before what is needed there was bought.
+	# This takes just milliseconds and is usually not a bad route.
+	def _build_greedy_route(self):
+		state = self.state
+		route = []
+		not_visited = list(range(len(state.locations)))
+		state.undo(0)
+
+		while not_visited:
+			best = None
+			for stop in not_visited:
+				mark = state.mark()
+				state.visit(stop)
+				this = (state.score(), state.open_missions_at(stop))
+				state.undo(mark)
+
+				if best is None or this < best[0]:
+					best = (this, stop)
+
+			state.visit(best[1])
+			route.append(best[1])
+			not_visited.remove(best[1])
 
-		if (first and second) or (third and fourth):
-			self.best_remaining_missions = remaining_missions
-			self.best_trader = deepcopy(self.trader)
-			self.best_run_messages = deepcopy(self.messages)
+		score = state.score()
+		state.undo(0)
 
-		# Don't forget to delete the messages generated in _buy_at_location()
-		# and _sell_at_location() for the next permutation.
+		return route, score
+
+
+	# Once the best route is known it is flown once more with a copy of the 
+	# trader. This time the user is told what to do at each location.
+	def _fly_best_route(self):
+		# No route was better than doing nothing at all.
+		if self.best_route is None:
+			return
+
+		self.trader = deepcopy(self.original_trader)
+
+		# An origin location may not have been declared by the user.
+		if self.origin_location[0]:
+			self._sell_at_location(self.origin_location)
+			self._buy_at_location(self.origin_location)
+
+		for stop in self.best_route:
+			location = self.state.locations[stop]
+			self._sell_at_location(location)
+			self._buy_at_location(location)
+
+		self.best_trader = self.trader
+		self.best_run_messages = self.messages
 		self.messages = []
 
 
 
 	# Finding the optimal route is basically a combinatorial problem. That 
 	# means the number of possibilities grows factorial!
-	# Testing has shown that performing the calculations for all possible
-	# routes with 9 possible locations takes a bearable amount if time. 
-	# Not so with 10. Hence, up to 9 locations the "exact solution" is 
-	# calculated. That is what this function does.
+	# However, most routes don't need to be looked at. Routes are build 
+	# location by location (a depth-first search). All routes that start 
+	# with the same locations share what is done at these locations (see 
+	# RouteState.mark() and undo()). And before the locations that are left
+	# are tried in all orders, RouteState.bound() tells how good any of 
+	# these routes could be at best. If that isn't better than the best 
+	# route so far, none of these routes is flown (branch and bound).
+	# Also, different routes often lead to the same situation (the same 
+	# locations are left, the same missions are open and the same 
+	# commodities still need to be bought). Everything that can happen 
+	# afterwards was already tried the first time. Thus, it isn't tried 
+	# again.
+	# The routes are tried in the same order as permutations() would give 
+	# them. Thus the same route is found as if all of them were flown.
 	# < stations_to_visit > is just the number of stations to be visited.
 	# It is computed in _find_route().
-	def _compute_all_permutations(self, stations_to_visit):
-		number_of_combinations = factorial(stations_to_visit)
+	# Each time a better route is found, this (and all methods below that 
+	# search routes) yields.
+	def _search_all_routes(self, stations_to_visit):
+		self._prepare_search(stations_to_visit)
+
+		not_visited = (1 << stations_to_visit) - 1
+
+		if self.workers > 1 and stations_to_visit >= self.parallel_minimum:
+			yield from self._search_in_parallel(stations_to_visit)
+		elif self._can_be_better(not_visited):
+			yield from self._search_routes_from_here([], not_visited)
+
+
+	# This method sets what is needed to count the routes while searching.
+	# < routes > is how many routes there are to be searched (all possible 
+	# routes if None).
+	def _prepare_search(self, stations_to_visit, routes = None):
+		self.stations_to_visit = stations_to_visit
+		self.number_of_combinations = routes or factorial(stations_to_visit)
+		# How many routes were flown or didn't need to be flown. The user 
+		# is told about it for every ca. 1/1000 of all routes (but not more 
+		# often than every 1000 routes).
+		self.routes_checked = 0
+		self.report_every = max(1000, self.number_of_combinations // 1000)
+		self.next_report = self.report_every
+		# The situations that were already seen (see above).
+		self.seen = set()
+
+
+	# With many locations the search is split up between several processes.
+	# Each process searches the routes that start with a given pair of 
+	# locations. When a process finds a better route, the score of it is 
+	# put into shared memory. Thus all processes skip routes that can't be 
+	# better than the best route ANY process has found so far. If a route
+	# is found that leaves no mission open, all processes stop.
+	# ATTENTION: The processes don't search in the same order as 
+	# _search_routes_from_here() does. Thus, if several routes are equally 
+	# good, another one may be found.
+	# ATTENTION: A better route is yielded not when it is found but when the
+	# process that found it is done with its pair of locations.
+	def _search_in_parallel(self, stations_to_visit):
+		prefixes = [(first, second) for first in range(stations_to_visit) \
+					for second in range(stations_to_visit) if first != second]
+		# Routes that start with the other pairs lead to the same results.
+		searched = [prefix for prefix in prefixes if \
+									self._is_canonical(prefix)]
+		self._count_routes((len(prefixes) - len(searched)) * \
+										factorial(stations_to_visit - 2))
+		prefixes = searched
+
+		# Both numbers of the score in one integer so that they are always 
+		# read and written together.
+		self.shared_best = multiprocessing.Value('q', \
+				self.best_remaining_missions << 32 | \
+				self.best_needed_commodities, lock = False)
+		self.shared_lock = multiprocessing.Lock()
+
+		arguments = (self.state, self.shared_best, self.shared_lock, \
+										stations_to_visit, self.deadline)
+		with multiprocessing.Pool(self.workers, initializer = _start_worker, \
+											initargs = arguments) as pool:
+			for checked, score, route in pool.imap(_search_prefix, prefixes):
+				self._load_best()
+				self._count_routes(checked)
+
+				# A route that is not as good as the best score anymore was
+				# beaten by a process that isn't done yet. The route with 
+				# the best score in the end is always returned by the 
+				# process that found it.
+				best = (self.best_remaining_missions, \
+												self.best_needed_commodities)
+				if route is not None and score == best and \
+													route != self.best_route:
+					self.best_route = route
+					yield
+
+		self.shared_best = None
+		self.shared_lock = None
+
+
+	# This method makes a RouteFinder() that does nothing but searching the
+	# routes that start with a given pair of locations in a process of the 
+	# pool in _search_in_parallel(). The arguments are the attributes with
+	# the same names of the RouteFinder() that started the pool.
+	def _become_worker(self, state, shared_best, shared_lock, \
+										stations_to_visit, deadline):
+		self.state = state
+		self.batch = cb.RouteBatch(state)
+		self.shared_best = shared_best
+		self.shared_lock = shared_lock
+		self.deadline = deadline
+		self.best_route = None
+		self._prepare_search(stations_to_visit)
+		# A worker doesn't tell the user how far it is.
+		self.next_report = float('inf')
+		self._load_best()
+
+
+	# This method searches all routes that start with the locations in 
+	# < prefix > (in a process of the pool).
+	# It returns how many routes were checked, the score of the best route
+	# found and the route itself (None if no better route was found).
+	def _search_prefix(self, prefix):
+		already_checked = self.routes_checked
+		self.best_route = None
+		self._load_best()
+
+		route = []
+		not_visited = (1 << self.stations_to_visit) - 1
+
+		for i, stop in enumerate(prefix):
+			self.state.visit(stop)
+			route.append(stop)
+			not_visited &= ~(1 << stop)
+
+			# Just the situation after the whole prefix is searched 
+			# completely here. Thus just that one may be remembered.
+			situation = (not_visited, self.state.key())
+
+			# Just the routes that start with < prefix > are counted. The 
+			# other routes that start like this are counted with their own
+			# prefixes.
+			if self._should_stop() or situation in self.seen or \
+										not self._can_be_better(not_visited):
+				self._count_routes(factorial(self.stations_to_visit - \
+																len(prefix)))
+				break
+			elif i == len(prefix) - 1:
+				self.seen.add(situation)
+				# A process just needs the best route in the end.
+				for _ in self._search_routes_from_here(route, not_visited):
+					pass
+
+		self.state.undo(0)
+
+		score = None
+		if self.best_route is not None:
+			score = self.state.fly(self.best_route)
+			self.state.undo(0)
+
+		return self.routes_checked - already_checked, score, self.best_route
+
+
+	# If several processes search at the same time, this method gets the 
+	# score of the best route any of them has found so far.
+	def _load_best(self):
+		if self.shared_best is not None:
+			self.best_remaining_missions, self.best_needed_commodities = \
+										divmod(self.shared_best.value, 1 << 32)
+
+
+	# This method remembers < route > as the best route so far. If several
+	# processes search at the same time, another process may have found a
+	# better route in the meantime. In that case < route > is NOT 
+	# remembered and False is returned.
+	def _new_best(self, remaining_missions, needed_commodities, route):
+		if self.shared_best is not None:
+			with self.shared_lock:
+				self._load_best()
+
+				if not self._is_better(remaining_missions, needed_commodities):
+					return False
 
-		for i, locations in enumerate(self.location_permutations):
-			if (i + 1) % 1000 == 0:
-				this = "Went through {} of {} ".format(i + 1, number_of_combinations)
-				that = "possible routes. Best run so far left "
-				siht = "{} mission(s) open".format(self.best_remaining_missions)
-				print(this + that + siht)
+				self.shared_best.value = \
+								remaining_missions << 32 | needed_commodities
 
-			self._fly_this_route(locations)
+		self.best_remaining_missions = remaining_missions
+		self.best_needed_commodities = needed_commodities
+		self.best_route = tuple(route)
+
+		return True
+
+
+	# This method exists just to keep _search_all_routes() more tidy.
+	# < route > are the locations visited so far and < not_visited > is a
+	# bitset with the positions of the locations that are left.
+	def _search_routes_from_here(self, route, not_visited):
+		if not not_visited:
+			if self._check_this_route(route):
+				yield
+			return
+
+		left = bin(not_visited).count('1')
+
+		if left <= self.batch_tail:
+			yield from self._check_all_tails(route, not_visited)
+			return
+
+		for stop in range(len(self.state.locations)):
+			if not not_visited >> stop & 1:
+				continue
+
+			if not self._may_go_to(stop, not_visited):
+				self._count_routes(factorial(left - 1))
+				continue
+
+			mark = self.state.mark()
+			self.state.visit(stop)
+			route.append(stop)
+
+			situation = (not_visited & ~(1 << stop), self.state.key())
+
+			if situation not in self.seen and \
+									self._can_be_better(situation[0]):
+				self.seen.add(situation)
+				yield from self._search_routes_from_here(route, situation[0])
+			else:
+				self._count_routes(factorial(left - 1))
+
+			route.pop()
+			self.state.undo(mark)
 
 			# Once _a_ route is found that doesn't require me to visit any
 			# of the given stations several times I do not need to search
 			# for another route that would lead to the same result.
-			if self.best_remaining_missions == 0:
-				break
-
-
-	# 9! is approx. 400,000. In the worst case the program needs to go through 
-	# all possible routes and it would need ca. 5 minutes. I consider this 
-	# bearable. Thus, _compute_all_permutations() will be used in the above case.
-	# With just one location more to visit the time to calculate all possible
-	# routes becomes UNbearable. However, permutations() (as used in 
-	# _permutate_locations()) generates lists of locations which are NOT too 
-	# different from one element to the next since just the position of two
-	# elements are switched. Hence, if the first permutation is a worst case
-	# the computations will take very much time. Also, radical changes in the
-	# permutation take place just over many permutations. This however can be 
-	# considered as randomizing the order of the elements in a list of locations.
+			if self._should_stop():
+				return
+
+
+	# This method flies all orders of the locations in < not_visited > that
+	# are left after < route > at once. They are checked in the same order as
+	# _search_routes_from_here() would check them. Thus the same route is 
+	# found. Like there, orders that lead to the same result as another 
+	# order are not flown (see RouteState.before).
+	def _check_all_tails(self, route, not_visited):
+		left = [stop for stop in range(len(self.state.locations)) \
+											if not_visited >> stop & 1]
+		tails = [tail for tail in permutations(left) \
+								if self._is_canonical(tail, not_visited)]
+		self._count_routes(factorial(len(left)) - len(tails))
+		tails = np.array(tails, dtype = 'i8')
+
+		best = (self.best_remaining_missions, self.best_needed_commodities)
+		scores = self.batch.evaluate(tails, \
+									self.batch.situation(self.state), best)
+
+		yield from self._check_routes(route, tails, scores)
+
+
+	# This method checks < routes > (a 2-D array, one route per row) with 
+	# their < scores > (see RouteBatch.evaluate()) in the given order as if
+	# each was flown alone. Each time one is the best route so far, it 
+	# yields. All routes start with the locations in < route >.
+	def _check_routes(self, route, routes, scores):
+		self._count_routes(len(routes))
+
+		remaining_missions, needed_commodities = scores
+		# Just routes that are better than the best route before the first 
+		# of them can become the best route. These are few.
+		better = (remaining_missions <= self.best_remaining_missions) & \
+				(needed_commodities <= self.best_needed_commodities) & \
+				((remaining_missions < self.best_remaining_missions) | \
+				(needed_commodities < self.best_needed_commodities))
+
+		for i in np.flatnonzero(better):
+			score = int(remaining_missions[i]), int(needed_commodities[i])
+
+			if self._is_better(*score) and \
+					self._new_best(score[0], score[1], route + routes[i].tolist()):
+				yield
+
+			if self._should_stop():
+				return
+
+
+	# This method checks if any route that continues from here and visits
+	# the locations in < not_visited > could be better than the best route.
+	def _can_be_better(self, not_visited):
+		self._load_best()
+
+		return self._is_better(*self.state.bound(not_visited))
+
+
+	# All locations of < route > were visited. This method returns True if
+	# it is the best route so far.
+	def _check_this_route(self, route):
+		self._count_routes(1)
+
+		remaining_missions, needed_commodities = self.state.score()
+
+		if self._is_better(remaining_missions, needed_commodities):
+			return self._new_best(remaining_missions, needed_commodities, route)
+
+		return False
+
+
+	# This method counts the routes that were checked and tells the user
+	# every now and then how far the search is.
+	def _count_routes(self, routes):
+		self.routes_checked += routes
+
+		if self.routes_checked >= self.next_report:
+			this = "Went through {} of {} ".format(self.routes_checked, \
+												self.number_of_combinations)
+			that = "possible routes. Best run so far left "
+			siht = "{} mission(s) open".format(self.best_remaining_missions)
+			print(this + that + siht)
+
+			while self.next_report <= self.routes_checked:
+				self.next_report += self.report_every
+
+
+	# This is the other way to find the best of all possible routes 
+	# (dynamic programming). 
+	# Many routes lead to the same situation (see _search_all_routes()). 
+	# What can be achieved from a situation on is figured out just once and 
+	# remembered. Thus, instead of n! routes just all situations need to be 
+	# looked at (at most 2^n times the different open missions and needed 
+	# commodities per set of locations left).
+	# What can be achieved are all scores (see RouteState.score()) of routes
+	# that are not worse in both missions and commodities than another route.
+	# In the end the route with the fewest open missions (and of these the 
+	# one with fewest commodities still needed) of the ones that are better
+	# than the best route so far is taken.
+	# ATTENTION: If several routes are equally good, this may be another 
+	# route than _search_all_routes() finds.
+	# ATTENTION: If the time is up before all situations were looked at, 
+	# the best route of the ones that were looked at is taken.
+	def _solve_all_routes(self, stations_to_visit):
+		# For each situation: a dict with the scores that can be achieved as
+		# keys and the location to go to next to achieve them as values.
+		self.outcomes = {}
+
+		not_visited = (1 << stations_to_visit) - 1
+		outcomes = self._outcomes_from_here(not_visited)
+
+		print("Looked at {} different situations.".format(len(self.outcomes)))
+
+		# The first route (see _build_greedy_route()) may be better than 
+		# min(outcomes) in one number. Then just the outcomes that are 
+		# better than it can be taken.
+		better = [score for score in outcomes if self._is_better(*score)]
+		if better:
+			best = min(better)
+			self.best_remaining_missions, self.best_needed_commodities = best
+			self.best_route = self._route_to(best, not_visited)
+			yield
+
+
+	# This method returns the scores that can be achieved from the current
+	# situation on if the locations in < not_visited > are visited.
+	def _outcomes_from_here(self, not_visited):
+		if not not_visited:
+			return {self.state.score():None}
+
+		# Nothing more is looked at if the time is up.
+		if time() > self.deadline:
+			return {}
+
+		situation = (not_visited, self.state.key())
+		if situation in self.outcomes:
+			return self.outcomes[situation]
+
+		outcomes = {}
+		for stop in range(len(self.state.locations)):
+			if not not_visited >> stop & 1 or \
+										not self._may_go_to(stop, not_visited):
+				continue
+
+			mark = self.state.mark()
+			self.state.visit(stop)
+
+			for score in self._outcomes_from_here(not_visited & ~(1 << stop)):
+				if score not in outcomes:
+					outcomes[score] = stop
+
+			self.state.undo(mark)
+
+		# A score that is worse in both than another score is of no interest.
+		# After sorting, this is the case for a score if a score before it has
+		# the same or fewer commodities still needed.
+		best = {}
+		fewest_needed = None
+		for score in sorted(outcomes):
+			if fewest_needed is None or score[1] < fewest_needed:
+				best[score] = outcomes[score]
+				fewest_needed = score[1]
+
+		self.outcomes[situation] = best
+
+		return best
+
+
+	# This method follows the remembered locations from the current 
+	# situation on to find the route that achieves < score >.
+	def _route_to(self, score, not_visited):
+		route = []
+		mark = self.state.mark()
+
+		while not_visited:
+			stop = self.outcomes[(not_visited, self.state.key())][score]
+			self.state.visit(stop)
+			route.append(stop)
+			not_visited &= ~(1 << stop)
+
+		self.state.undo(mark)
+
+		return tuple(route)
+
+
+	# Thanks to the bound, _search_all_routes() usually needs to look at just
+	# a tiny part of all routes. However, in the worst case it needs to go 
+	# through all of them. Up to self.exact_search_limit locations that is 
+	# bearable.
+	# With more locations to visit the time to calculate all possible
+	# routes becomes UNbearable. However, permutations() generates lists of 
+	# locations which are NOT too different from one element to the next 
+	# since just the position of two elements are switched. Hence, if the 
+	# first permutation is a worst case the computations will take very much
+	# time. Also, radical changes in the permutation take place just over 
+	# many permutations. This however can be considered as randomizing the 
+	# order of the elements in a list of locations.
 	# 
 	# Thus, I will NOT take the risk of running the program for very long but 
 	# the function at hand does rather this -- randomizing.
 	# 
-	# If the number of locations to be visited is larger than nine, the order
+	# If the number of locations to be visited is larger than that, the order
 	# of these locations is shuffled 400,023 times and than it is checked which
 	# one the best is.
 	# Yes, that does certainly NOT explore the whole space of possible routes.
 	# But since that would take so much time I wouldn't have done that anyway.
-	# Yes, that may lead to checking a possible route twice. So what? the 
-	# chances for that are really slim and if it happens a couple of times I can 
-	# live with it.
 	# But it is also very likely that I hit a route that is good enough.
 	# 
-	# Otherwise this method is the same as _compute_all_permutations().
+	# The random orders come from self.seed (see _random_codes()). Each 
+	# route is tried just once (up to self.heuristic_routes routes).
+	# 
+	# The random orders are flown self.batch_routes at once (see class 
+	# RouteBatch()). That is much faster than flying them one by one.
+	# 
+	# Otherwise this method does the same as _search_all_routes().
+	# ATTENTION: This is just used if self.heuristic is 'shuffle'. 
 	def _compute_random_routes(self):
-		# A permutations() object is a generator which is not subscriptable.
-		# However, _permutate_locations() does not just generate this, but
-		# also structures the data in a convenient way. Hence, I would like 
-		# to have one element from that object and this is how I can get it.
-		for locations in self.location_permutations:
-			# As I said: I need just one!
-			break
-
-		# I can't shuffle tuples.
-		locations = list(locations)
-
-		i = 0
-		while i < 400023:
-			# Here the random order is created. ... *lol* ...  a nice way of 
-			# saying bring this list deliberately into disorder :P
-			random.shuffle(locations)
-
-			if (i + 1) % 1000 == 0:
-				this = "Went through {} of 400,0023 random ".format(i + 1)
-				that = "possible routes. Best run so far left "
-				siht = "{} mission(s) open".format(self.best_remaining_missions)
-				print(this + that + siht)
-
-			self._fly_this_route(locations)
-
-			if self.best_remaining_missions == 0:
+		stations_to_visit = len(self.state.locations)
+		if self.time_limit is None:
+			self._prepare_search(stations_to_visit, self.heuristic_routes)
+		else:
+			self._prepare_search(stations_to_visit)
+			self.report_every = self.next_report = 1000
+
+		# Here the random orders are created. ... *lol* ...  a nice way 
+		# of saying bring these lists deliberately into disorder :P
+		generator = np.random.default_rng(self.seed)
+
+		for codes in self._random_codes(generator, stations_to_visit):
+			if self.time_limit is None:
+				codes = codes[:self.heuristic_routes - self.routes_checked]
+
+			routes = self._routes_from_codes(codes)
+
+			# Routes that can't be better than the best route so far are 
+			# not flown to the end.
+			best = (self.best_remaining_missions, self.best_needed_commodities)
+			yield from self._check_routes([], routes, \
+									self.batch.evaluate(routes, None, best))
+
+			if self._should_stop() or (self.time_limit is None and \
+							self.routes_checked >= self.heuristic_routes):
 				break
 
-			i += 1
 
+	# Each route is given by its Lehmer code: the first number is which of 
+	# all locations is visited first, the second which of the locations left
+	# is visited next and so on. Thus the i-th number is between 0 and 
+	# < stations_to_visit > - i. Drawing each number at random gives each 
+	# route with the same chance. Reading the code like a number with a 
+	# different base for each digit gives each route its own number (its 
+	# rank).
+	# This method yields the codes of random routes, up to 
+	# self.batch_routes at a time (as arrays with one code per row). 
+	# The ranks that were drawn are remembered and a route that was drawn 
+	# before is dropped. Thus each route is tried just once. But no more 
+	# than self.heuristic_routes ranks (or half of all routes, otherwise 
+	# hardly any new route would be drawn in the end) are remembered. After
+	# that routes may be drawn again.
+	def _random_codes(self, generator, stations_to_visit):
+		highest = stations_to_visit - np.arange(stations_to_visit)
+		# Python integers since 21! doesn't fit into 64 bits.
+		bases = np.array([factorial(stations_to_visit - 1 - i) \
+							for i in range(stations_to_visit)], dtype = object)
+		remember = min(self.heuristic_routes, factorial(stations_to_visit) // 2)
+		drawn = set()
+
+		while True:
+			codes = generator.integers(0, highest, \
+							size = (self.batch_routes, stations_to_visit))
+			if len(drawn) >= remember:
+				yield codes
+				continue
+
+			new = []
+			for i, rank in enumerate(codes.astype(object).dot(bases)):
+				if len(drawn) >= remember:
+					new.extend(range(i, len(codes)))
+					break
+				if rank not in drawn:
+					drawn.add(rank)
+					new.append(i)
+
+			yield codes[new]
+
+
+	# This method returns the routes (positions in self.state.locations) for
+	# the given < codes > (see _random_codes()), one route per row.
+	def _routes_from_codes(self, codes):
+		batch, stations_to_visit = codes.shape
+		rows = np.arange(batch)
+		routes = np.empty_like(codes)
+		left = np.ones((batch, stations_to_visit), dtype = bool)
+
+		for i in range(stations_to_visit):
+			# The first location up to which more locations are left than 
+			# the number in the code is the one to go to next.
+			stop = (left.cumsum(axis = 1) > codes[:, i:i + 1]).argmax(axis = 1)
+			routes[:, i] = stop
+			left[rows, stop] = False
+
+		return routes
+
+
+	# Random routes are hardly ever good routes. It is much better to 
+	# improve a route step by step (see class RouteImprover()). It starts 
+	# from < route > (see _build_greedy_route()).
+	# If a time limit is given, routes are tried until the time is up.
+	def _improve_routes(self, route):
+		stations_to_visit = len(self.state.locations)
+		if self.time_limit is None:
+			self._prepare_search(stations_to_visit, self.heuristic_routes)
+		else:
+			self._prepare_search(stations_to_visit)
+			self.report_every = self.next_report = 1000
+
+		improver = ci.RouteImprover(self.state, self.seed)
+		for route, score in improver.routes(route):
+			self._count_routes(1)
+
+			# The route was not flown to the end (see class RouteImprover()).
+			# It is counted anyway since it was looked at.
+			if score is not None and self._is_better(*score):
+				self._new_best(score[0], score[1], route)
+				yield
+
+			if self._should_stop() or (self.time_limit is None and \
+							self.routes_checked >= self.heuristic_routes):
+				break
+
+
+	# This method yields each route that is better than all routes before.
+	# What is yielded is the number of missions that stay open, the number 
+	# of commodities that still need to be bought and the route as a list of
+	# (system-name, station-name) tuples.
+	# The first route comes right away (see _build_greedy_route()). 
+	# Afterwards better routes are searched until the best route was found 
+	# or the time limit (if any) is up. Once nothing more is yielded the
+	# best route was flown (see _fly_best_route()).
+	# ATTENTION: If the caller stops earlier, _fly_best_route() was NOT 
+	# called.
+	def better_routes(self):
+		if self.time_limit is not None:
+			self.deadline = time() + self.time_limit
 
-	# This is the main method that calls methods which call other methods
-	# and so on and in the end the best route is found.
-	def _find_route(self):
 		# trader.locations contains ALL locations that need to be visited, 
 		# including stations from which i just pick up stuff but don't have a 
 		# mission to.
-		stations_to_visit = sum([len(values) for values in self.trader.locations.values()])
+		stations_to_visit = len(self.state.locations)
 
 		print("{} stations need to be visited.".format(stations_to_visit))
+		# Some of the possible routes lead to the same result as others (see
+		# RouteState.before).
+		if self.state.routes < factorial(stations_to_visit):
+			this = "Just {} of the {} ".format(self.state.routes, \
+												factorial(stations_to_visit))
+			that = "possible routes lead to different results."
+			print(this + that)
 		print("Optimizing the route (this will take a while!) ...")
 
-		if stations_to_visit <= 9:
-			self._compute_all_permutations(stations_to_visit)
+		clusters = self.state.clusters()
+		if len(clusters) > 1:
+			searches = self._search_clusters(clusters)
 		else:
-			self._compute_random_routes()
+			searches = self._search_routes()
 
+		for _ in searches:
+			yield self._best_so_far()
 
+		if time() > self.deadline:
+			print("The time is up. This is the best route found so far.")
 
+		self._fly_best_route()
 
 
+	# This method finds a first route right away and then searches for 
+	# better routes in the way that fits the number of locations. Each time
+	# a better route is found, it yields.
+	def _search_routes(self):
+		stations_to_visit = len(self.state.locations)
 
+		route, score = self._build_greedy_route()
+		if self._is_better(*score):
+			self._new_best(score[0], score[1], route)
+			yield
 
+		if self.best_remaining_missions == 0:
+			searches = iter(())
+		elif self.state.routes <= factorial(self.exact_search_limit):
+			if self.engine == 'dp':
+				searches = self._solve_all_routes(stations_to_visit)
+			else:
+				searches = self._search_all_routes(stations_to_visit)
+		elif self.heuristic == 'shuffle':
+			searches = self._compute_random_routes()
+		else:
+			searches = self._improve_routes(route)
+
+		yield from searches
+
+
+	# If the locations fall into groups that don't influence each other 
+	# (see RouteState.clusters()), the best route for each group is searched
+	# on its own. The best route is then one after the other. 
+	# Until the best route of a group is known, the locations of that group 
+	# are visited in the order of the first route (see 
+	# _build_greedy_route()). Each time the best route of a group is known, 
+	# it yields if the whole route is better than before.
+	# With several groups that are large enough (see self.parallel_minimum)
+	# and several processes, the groups are searched at the same time.
+	# ATTENTION: If a group has several best routes (one leaves fewer 
+	# missions open, the other needs fewer commodities), just one of them is
+	# kept. Thus the routes found may not be the best in combination. That 
+	# is the same for both engines.
+	def _search_clusters(self, clusters):
+		sizes = ", ".join(str(len(cluster)) for cluster in clusters)
+		this = "The stations are {} groups that don't ".format(len(clusters))
+		that = "influence each other ({} stations).".format(sizes)
+		print(this + that)
+
+		route, score = self._build_greedy_route()
+		if self._is_better(*score):
+			self._new_best(score[0], score[1], route)
+			yield
+
+		if self.best_remaining_missions == 0:
+			return
+
+		# The route of each group as positions in self.state.locations.
+		routes = [[stop for stop in route if stop in cluster] \
+													for cluster in clusters]
+
+		large = [cluster for cluster in clusters \
+									if len(cluster) >= self.parallel_minimum]
+		if self.workers > 1 and len(large) > 1:
+			found = self._search_clusters_in_parallel(clusters)
+		else:
+			found = self._search_clusters_one_by_one(clusters)
+
+		for i, this_route in found:
+			routes[i] = this_route
+
+			route = [stop for this_route in routes for stop in this_route]
+			score = self.state.fly(route)
+			self.state.undo(0)
 
+			if self._is_better(*score):
+				self._new_best(score[0], score[1], route)
+				yield
+
+			if self._should_stop():
+				break
 
 
+	# This method searches the best route for each group in < clusters > 
+	# after the other. It yields the position of the group in < clusters > 
+	# and the best route for it (positions in self.state.locations).
+	# Each group gets an equal share of the time that is left.
+	def _search_clusters_one_by_one(self, clusters):
+		for i, cluster in enumerate(clusters):
+			deadline = self.deadline
+			if self.time_limit is not None:
+				deadline = time() + (self.deadline - time()) / (len(clusters) - i)
+
+			part = RouteFinder.__new__(RouteFinder)
+			part._become_part(self.state.part(cluster), self.engine, \
+										self.heuristic, deadline, self.workers)
+
+			for _ in part._search_routes():
+				pass
+
+			if part.best_route is not None:
+				yield i, [cluster[stop] for stop in part.best_route]
+
+
+	# This method does the same as _search_clusters_one_by_one() but the 
+	# groups are searched at the same time in several processes (each 
+	# group in one process). The groups are yielded when they are done.
+	def _search_clusters_in_parallel(self, clusters):
+		arguments = [(i, self.state.part(cluster), self.engine, \
+						self.heuristic, self.deadline) \
+						for i, cluster in enumerate(clusters)]
+		with multiprocessing.Pool(min(self.workers, len(clusters))) as pool:
+			for i, route in pool.imap_unordered(_search_part, arguments):
+				if route is not None:
+					yield i, [clusters[i][stop] for stop in route]
+
+
+	# This method makes a RouteFinder() that does nothing but searching the
+	# best route for the locations of a group (see _search_clusters()).
+	# < state > is the RouteState.part() for them, < engine >, 
+	# < heuristic > and < workers > are like for a RouteFinder() and 
+	# < deadline > is when the search stops (see better_routes()).
+	def _become_part(self, state, engine, heuristic, deadline, workers):
+		self.engine = engine
+		self.heuristic = heuristic
+		self.deadline = deadline
+		self.time_limit = None
+		if deadline != float('inf'):
+			self.time_limit = deadline - time()
+		self.workers = workers
+		self.shared_best = None
+		self.shared_lock = None
+		self.state = state
+		self.batch = cb.RouteBatch(state)
+		self.best_remaining_missions, self.best_needed_commodities = \
+														state.nothing_done()
+		self.best_route = None
+
+
+	# What better_routes() yields.
+	def _best_so_far(self):
+		stops = [self.state.locations[stop][:2] for stop in self.best_route]
+
+		return self.best_remaining_missions, self.best_needed_commodities, \
+																		stops
 
 
+	# This is the main method that calls methods which call other methods
+	# and so on and in the end the best route is found.
+	def _find_route(self):
+		for _ in self.better_routes():
+			pass
 
 
+# The RouteFinder() of a process of the pool in 
+# RouteFinder._search_in_parallel().
+_worker = None
 
 
+# Functions that are given to the pool need to be found by name. Thus they 
+# can't be methods.
+def _start_worker(state, shared_best, shared_lock, stations_to_visit, \
+																deadline):
+	global _worker
+	_worker = RouteFinder.__new__(RouteFinder)
+	_worker._become_worker(state, shared_best, shared_lock, \
+										stations_to_visit, deadline)
 
 
+def _search_prefix(prefix):
+	return _worker._search_prefix(prefix)
 
 
+# This is what a process of the pool in RouteFinder._search_clusters_in_parallel()
+# does for one group. < arguments > are the position of the group, its 
+# RouteState.part(), the engine, the heuristic and the deadline (see 
+# RouteFinder._become_part()). It returns the position and the best route of 
+# the group (None if no route was better than doing nothing at all).
+def _search_part(arguments):
+	i, state, engine, heuristic, deadline = arguments
+	part = RouteFinder.__new__(RouteFinder)
+	# A process of a pool can't start processes itself.
+	part._become_part(state, engine, heuristic, deadline, 1)
 
+	for _ in part._search_routes():
+		pass
 
+	return i, part.best_route
@@ -0,0 +1,219 @@
+#    "class_routeimprover" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file contains the class definition for the object that class
+# RouteFinder() uses if there are too many locations to search all routes.
+#
+# Trying random routes never makes use of a good route that was found.
+# Instead, this object changes a route a little bit (swaps two locations,
+# moves one location elsewhere or reverses the order of a part of the route)
+# and keeps the change if the route gets better. Sometimes it keeps a change
+# even if the route gets worse so that it doesn't get stuck (simulated
+# annealing). How often that happens gets less and less over time. From time
+# to time it starts again from the best route so far.
+#
+# A route that was changed just needs to be flown again from the first
+# location that changed on (see RouteState.mark() and undo()).
+
+import math
+import random
+
+
+class RouteImprover(object):
+	# How many routes are tried before starting again from the best route.
+	routes_per_round = 20000
+
+	# How likely it is that a worse route is kept depends on the
+	# "temperature". In each round it goes down from the first to the
+	# second value.
+	temperatures = (2.0, 0.05)
+
+	# < state > is the class RouteState() instance the routes are flown
+	# with.
+	# < seed > is for the random numbers. None means that they are
+	# different every time.
+	def __init__(self, state, seed = None):
+		self.state = state
+		self.random = random.Random(seed)
+
+		self.stations_to_visit = len(state.locations)
+		# A score is turned into one number so that two scores can be
+		# compared by how much one is worse. A mission that stays open is
+		# always worse than any number of commodities that still need to be
+		# bought.
+		self.weight = len(state.needed_quantity) + 1
+		# The missions (bitset) at each location. A mission that is still 
+		# open once its location was visited stays open (see _fly_from()).
+		self.missions_at = [sum(1 << mission for mission, _, _ in sells) \
+														for sells in state.sells]
+
+		# The route that is changed ...
+		self.route = []
+		# ... what RouteState.mark() returned before each of its locations
+		# was visited ...
+		self.marks = []
+		# ... and its score.
+		self.score = None
+
+		self.best_route = None
+		self.best_energy = None
+
+
+	# This method turns < score > into one number. The smaller the better.
+	def _energy(self, score):
+		return score[0] * self.weight + score[1]
+
+
+	# This method flies self.route from position < start > on. Everything
+	# before < start > was already flown.
+	# If < limit > (an energy) is given, the route is not flown to the end 
+	# once the missions that stay open for sure (the ones that are still 
+	# open although their location was visited or isn't on the rest of the
+	# route) make its energy at least that. This is much cheaper to check
+	# than RouteState.bound() and thus it is checked after every location.
+	# If the route is not flown to the end, self.score is just these 
+	# missions (it may be too good but its energy is at least < limit >), 
+	# self.marks is NOT complete and False is returned.
+	def _fly_from(self, start, limit = None):
+		state = self.state
+		state.undo(self.marks[start])
+		del self.marks[start + 1:]
+
+		ahead = 0
+		if limit is not None:
+			for stop in self.route[start:]:
+				ahead |= self.missions_at[stop]
+
+		for stop in self.route[start:]:
+			state.visit(stop)
+			self.marks.append(state.mark())
+
+			if limit is not None:
+				ahead &= ~self.missions_at[stop]
+				left_open = bin(state.open_missions & ~ahead).count('1')
+				if left_open * self.weight >= limit:
+					self.score = (left_open, 0)
+					return False
+
+		self.score = state.score()
+
+		return True
+
+
+	# This method makes a random change to self.route. It returns the first
+	# position that was changed and the route as it was before.
+	def _change(self):
+		route = self.route
+		old_route = list(route)
+		i, j = sorted(self.random.sample(range(self.stations_to_visit), 2))
+		move = self.random.random()
+
+		if move < 1/3:
+			# Two locations are swapped.
+			route[i], route[j] = route[j], route[i]
+		elif move < 2/3:
+			# One location is moved elsewhere.
+			if self.random.random() < 0.5:
+				route.insert(j, route.pop(i))
+			else:
+				route.insert(i, route.pop(j))
+		else:
+			# The order of a part of the route is reversed (2-opt).
+			route[i:j + 1] = route[i:j + 1][::-1]
+
+		return i, old_route
+
+
+	# This method starts a new round from < route >.
+	def _start_round(self, route):
+		self.route = list(route)
+		self.state.undo(0)
+		self.marks = [self.state.mark()]
+		self._fly_from(0)
+
+
+	# This method flies one changed route after the other, starting from
+	# < route > (a list with positions in state.locations; a random route if
+	# None). It yields each route (it is changed afterwards!) with its score
+	# (see RouteState.score()). It never ends by itself, the caller decides
+	# when enough routes were tried.
+	# A route that will not be kept for sure is not flown to the end (see 
+	# _fly_from()). For such a route None is yielded as score since its real
+	# score is not known.
+	def routes(self, route = None):
+		if self.stations_to_visit < 2:
+			route = list(range(self.stations_to_visit))
+			yield route, self.state.fly(route)
+			return
+
+		if route is None:
+			route = list(range(self.stations_to_visit))
+			self.random.shuffle(route)
+
+		self._start_round(route)
+		self.best_route = list(self.route)
+		self.best_energy = self._energy(self.score)
+
+		yield self.route, self.score
+
+		hot, cold = self.temperatures
+		cooling = (cold / hot) ** (1.0 / self.routes_per_round)
+		temperature = hot
+
+		i = 1
+		while True:
+			if i % self.routes_per_round == 0:
+				# Start again (with a slightly changed best route).
+				self._start_round(self.best_route)
+				for _ in range(3):
+					start, _ = self._change()
+					self._fly_from(start)
+				temperature = hot
+
+			energy = self._energy(self.score)
+			old_score = self.score
+			start, old_route = self._change()
+			# What needs to be done again if the change is NOT kept.
+			old_marks = self.marks[start + 1:]
+			old_changes = self.state.changes_since(self.marks[start])
+			# A worse route is kept with a chance of exp(-worse / temperature).
+			# The same is to draw beforehand by how much it may be worse at 
+			# most. Thus the route doesn't need to be flown to the end once 
+			# it is worse than that for sure. Such a route can't be the best 
+			# route either.
+			most_worse = -temperature * math.log(1.0 - self.random.random())
+			flown = self._fly_from(start, energy + max(most_worse, 1))
+
+			yield self.route, (self.score if flown else None)
+
+			new_energy = self._energy(self.score)
+			if flown and new_energy < self.best_energy:
+				self.best_energy = new_energy
+				self.best_route = list(self.route)
+
+			worse = new_energy - energy
+			if not flown or (worse > 0 and worse >= most_worse):
+				# The change is NOT kept.
+				self.route = old_route
+				self.state.undo(self.marks[start])
+				self.state.redo(old_changes)
+				self.marks[start + 1:] = old_marks
+				self.score = old_score
+
+			temperature *= cooling
+			i += 1
@@ -0,0 +1,459 @@
+#    "class_routestate" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file contains the class definition for the object that class
+# RouteFinder() uses to check how good a route is.
+#
+# Flying a route changes the cargo, what still needs to be delivered and what
+# still needs to be bought. Making a copy of the whole Trader() for each route
+# to do this takes much longer than flying the route itself. Thus, what
+# matters is taken from the Trader() ONCE and stored in a few flat lists of
+# integers. A route is flown on these lists. Before the next route is flown
+# everything that was done is undone (or the lists are set back to how they
+# were at the beginning).
+#
+# ATTENTION: Buying and selling here MUST do exactly the same as
+# RouteFinder._sell_at_location() and RouteFinder._buy_at_location()! These
+# are still used to tell the user what to do on the best route.
+
+from copy import copy
+from math import factorial
+
+
+class RouteState(object):
+	# < trader > is the class Trader() instance that contains the information
+	# necessary to calculate the route. It is NOT changed.
+	def __init__(self, trader):
+		warez = trader.warez
+
+		# The locations in the same order as in trader.locations. A route is
+		# a list with positions in this list. Each location is a tuple with
+		# the system-name, station-name and available commodities (bitset).
+		self.locations = []
+		for system, stations in trader.locations.items():
+			for station, commodities in stations.items():
+				self.locations.append((system, station, commodities))
+
+		# Each commodity that needs to be delivered to a specific station is
+		# one mission (see RouteFinder._count_missions()). For each station
+		# the missions are a list of (mission, ware, quantity) tuples with the
+		# ware being the position in trader.warez. The lists are in the same
+		# order as trader.warez.
+		missions_at = {}
+		# The same as (ware, quantity) tuples with the mission as position.
+		self._missions = []
+		for ware in warez:
+			for system, stations in ware.sell_at.items():
+				for station, quantity in stations.items():
+					missions = missions_at.setdefault((system, station), [])
+					missions.append((len(self._missions), ware.id, quantity))
+					self._missions.append((ware.id, quantity))
+
+		# How much of a commodity needs to be bought (wholesale!).
+		self.needed_quantity = [0] * len(warez)
+		needed_at_start = 0
+		for commodity, quantity in trader.needed_commodities.items():
+			this_id = trader.commodities.get(commodity)
+			self.needed_quantity[this_id] = quantity
+			needed_at_start |= 1 << this_id
+
+		# Locations are the same as in self.locations. If I start at a
+		# station, it is the last one. It is visited before every route 
+		# (see reset()) and never undone.
+		stops = list(self.locations)
+		self.origin = None
+		if trader.start_system:
+			self.origin = len(stops)
+			stops.append((trader.start_system, trader.start_station, \
+												trader.start_commodities))
+
+		# What can be sold and bought at each stop.
+		self.sells = []
+		self.buys = []
+		for system, station, commodities in stops:
+			self.sells.append(missions_at.get((system, station), []))
+			available = commodities & needed_at_start
+			self.buys.append([ware.id for ware in warez \
+												if available >> ware.id & 1])
+
+		# For bound(): at which location a mission can be finished (-1 if
+		# at none, e.g., if it is at the origin) and at which locations 
+		# (bitset of positions in self.locations) a ware can be bought.
+		# A commodity that needs more space than the whole cargo bay has can't 
+		# be bought anywhere.
+		self._mission_location = [-1] * len(self._missions)
+		self._bought_at = [0] * len(warez)
+		cargo_bay = trader.free_cargo + sum(ware.quantity for ware in warez)
+		for stop in range(len(self.locations)):
+			for mission, _, _ in self.sells[stop]:
+				self._mission_location[mission] = stop
+			for ware in self.buys[stop]:
+				if self.needed_quantity[ware] <= cargo_bay:
+					self._bought_at[ware] |= 1 << stop
+		# The commodities that need to be bought.
+		self._wanted = [ware.id for ware in warez \
+										if needed_at_start >> ware.id & 1]
+
+		self._find_same_locations()
+
+		# This is how everything is before the first location is visited.
+		self._start_quantity = [ware.quantity for ware in warez]
+		self._start_free_cargo = trader.free_cargo
+		self._start_needed = needed_at_start
+		self._start_needed_count = len(trader.needed_commodities)
+		self._start_open = (1 << len(self._missions)) - 1
+		self._start_remaining = len(self._missions)
+
+		# Everything that was done since the last reset(). A sold mission is
+		# stored as its (positive) number, a bought ware as ~ware (which is
+		# negative).
+		self._log = []
+
+		self.reset()
+
+
+	# Many routes lead to the same result. At locations where nothing can
+	# be sold and the same commodities can be bought (e.g., different 
+	# stations to pick up the same commodity) exactly the same happens. 
+	# Thus it doesn't matter in which order these are visited. And at 
+	# locations where nothing can be sold or bought nothing happens. 
+	# Thus it doesn't matter when these are visited.
+	# Hence just routes in which these locations are visited in a fixed 
+	# order (the former in the order of their positions, the latter 
+	# last) need to be looked at. This method finds for each location the 
+	# locations that are visited before it in such a route (bitset of 
+	# positions in self.locations) and how many routes are left.
+	def _find_same_locations(self):
+		self.before = [0] * len(self.locations)
+		# The locations that are the same (see above) as bitset, by what can 
+		# be bought there.
+		same = {}
+		something = 0
+		for stop in range(len(self.locations)):
+			if self.sells[stop]:
+				something |= 1 << stop
+				continue
+
+			buys = tuple(self.buys[stop])
+			self.before[stop] = same.get(buys, 0)
+			same[buys] = self.before[stop] | 1 << stop
+			if buys:
+				something |= 1 << stop
+
+		for stop in range(len(self.locations)):
+			if not self.sells[stop] and not self.buys[stop]:
+				self.before[stop] |= something
+
+		# How many routes are left.
+		self.routes = factorial(bin(something).count('1'))
+		for buys, stops in same.items():
+			if buys:
+				self.routes //= factorial(bin(stops).count('1'))
+
+
+	# Locations that have no commodity in common (to sell or to buy) don't 
+	# influence each other. That is, as long as the cargo bay can't get 
+	# full (which it can't if all commodities that still need to be bought
+	# fit into it at the same time). In that case, the best route for each
+	# group of locations that influence each other can be searched on its
+	# own (see part()). The best route for all locations is then just one
+	# of these routes after the other. And searching, e.g., two times 7 
+	# locations takes much, much less time than 14 locations.
+	# This method returns these groups (lists of positions in 
+	# self.locations, in the order of their first locations). If the cargo
+	# bay can get full, it returns just one group with all locations.
+	# ATTENTION: The route that is flown so far is undone.
+	def clusters(self):
+		stations = len(self.locations)
+
+		self.undo(0)
+		still_needed = sum(self.needed_quantity[ware] for ware in \
+								self._wanted if self.needed >> ware & 1)
+		if still_needed > self.free_cargo:
+			return [list(range(stations))]
+
+		# The commodities of each location and the locations of each 
+		# commodity.
+		wares_at = []
+		stops_with = {}
+		for stop in range(stations):
+			wares = set(self.buys[stop])
+			wares.update(ware for _, ware, _ in self.sells[stop])
+			wares_at.append(wares)
+			for ware in wares:
+				stops_with.setdefault(ware, []).append(stop)
+
+		clusters = []
+		found = set()
+		for first in range(stations):
+			if first in found:
+				continue
+
+			cluster = []
+			todo = [first]
+			found.add(first)
+			while todo:
+				stop = todo.pop()
+				cluster.append(stop)
+
+				for ware in wares_at[stop]:
+					for other in stops_with[ware]:
+						if other not in found:
+							found.add(other)
+							todo.append(other)
+
+			clusters.append(sorted(cluster))
+
+		return clusters
+
+
+	# This method returns a RouteState() for just the locations at the 
+	# positions < stops > (e.g., a group from clusters()). Missions and 
+	# commodities that have nothing to do with these locations are seen as
+	# done.
+	def part(self, stops):
+		this = copy(self)
+		position = {stop:i for i, stop in enumerate(stops)}
+
+		wares = set()
+		for stop in stops:
+			wares.update(self.buys[stop])
+			wares.update(ware for _, ware, _ in self.sells[stop])
+
+		this._start_open = 0
+		for mission, (ware, _) in enumerate(self._missions):
+			if ware in wares:
+				this._start_open |= 1 << mission
+		this._start_remaining = bin(this._start_open).count('1')
+		this._wanted = [ware for ware in self._wanted if ware in wares]
+		this._start_needed = 0
+		for ware in this._wanted:
+			this._start_needed |= self._start_needed & 1 << ware
+		this._start_needed_count = bin(this._start_needed).count('1')
+
+		this.locations = [self.locations[stop] for stop in stops]
+		this.sells = [self.sells[stop] for stop in stops]
+		this.buys = [self.buys[stop] for stop in stops]
+		if self.origin is not None:
+			this.origin = len(stops)
+			this.sells.append(self.sells[self.origin])
+			this.buys.append(self.buys[self.origin])
+
+		this._mission_location = [position.get(stop, -1) for stop in \
+												self._mission_location]
+		this._bought_at = [sum(1 << i for i, stop in enumerate(stops) \
+				if bought_at >> stop & 1) for bought_at in self._bought_at]
+
+		this._find_same_locations()
+		this._log = []
+		this.reset()
+
+		return this
+
+
+	# This method sets everything back to how it is before the first
+	# location of a route is visited. That includes buying and selling at the
+	# station where I start.
+	def reset(self):
+		self.quantity = list(self._start_quantity)
+		self.free_cargo = self._start_free_cargo
+		# A bitset of the missions that are still open.
+		self.open_missions = self._start_open
+		self.remaining_missions = self._start_remaining
+		self.needed = self._start_needed
+		self.needed_count = self._start_needed_count
+
+		if self.origin is not None:
+			self.visit(self.origin)
+
+		# Undoing the origin makes no sense.
+		self._log = []
+
+
+	# This method sells and buys at the location with the position < stop >.
+	# Like in RouteFinder: first everything is sold and then bought.
+	def visit(self, stop):
+		quantity = self.quantity
+		open_missions = self.open_missions
+		free_cargo = self.free_cargo
+		log = self._log
+
+		for mission, ware, this_quantity in self.sells[stop]:
+			# Don't sell anything if not enough of this commodity is in the
+			# cargo bay.
+			if open_missions >> mission & 1 and this_quantity <= quantity[ware]:
+				open_missions &= ~(1 << mission)
+				self.remaining_missions -= 1
+				quantity[ware] -= this_quantity
+				free_cargo += this_quantity
+				log.append(mission)
+
+		needed = self.needed
+		for ware in self.buys[stop]:
+			if needed >> ware & 1:
+				needed_quantity = self.needed_quantity[ware]
+				# Yes, this condition means that I buy just wholesale.
+				if free_cargo >= needed_quantity:
+					needed &= ~(1 << ware)
+					self.needed_count -= 1
+					quantity[ware] += needed_quantity
+					free_cargo -= needed_quantity
+					log.append(~ware)
+
+		self.open_missions = open_missions
+		self.free_cargo = free_cargo
+		self.needed = needed
+
+
+	# A route that starts in the same way as another route can continue from
+	# where the latter was before it went elsewhere. This method returns what
+	# needs to be given to undo() to go back to that point.
+	def mark(self):
+		return len(self._log)
+
+
+	# This method undoes everything that was done since mark() returned
+	# < mark >.
+	def undo(self, mark):
+		log = self._log
+
+		while len(log) > mark:
+			this = log.pop()
+
+			if this >= 0:
+				# Selling is undone.
+				ware, this_quantity = self._missions[this]
+				self.open_missions |= 1 << this
+				self.remaining_missions += 1
+				self.quantity[ware] += this_quantity
+				self.free_cargo -= this_quantity
+			else:
+				# Buying is undone.
+				ware = ~this
+				needed_quantity = self.needed_quantity[ware]
+				self.needed |= 1 << ware
+				self.needed_count += 1
+				self.quantity[ware] -= needed_quantity
+				self.free_cargo += needed_quantity
+
+
+	# This method returns everything that was done since mark() returned
+	# < mark >. It can be given to redo() after it was undone.
+	def changes_since(self, mark):
+		return self._log[mark:]
+
+
+	# This method does < changes > (see changes_since()) again. That is much
+	# faster than visiting the locations again.
+	def redo(self, changes):
+		for this in changes:
+			if this >= 0:
+				ware, this_quantity = self._missions[this]
+				self.open_missions &= ~(1 << this)
+				self.remaining_missions -= 1
+				self.quantity[ware] -= this_quantity
+				self.free_cargo += this_quantity
+			else:
+				ware = ~this
+				needed_quantity = self.needed_quantity[ware]
+				self.needed &= ~(1 << ware)
+				self.needed_count -= 1
+				self.quantity[ware] += needed_quantity
+				self.free_cargo -= needed_quantity
+
+		self._log.extend(changes)
+
+
+	# This method returns how many missions at the location with the 
+	# position < stop > are still open.
+	def open_missions_at(self, stop):
+		open_missions = self.open_missions
+
+		return sum(open_missions >> mission & 1 \
+										for mission, _, _ in self.sells[stop])
+
+
+	# Everything that happens from here on depends just on what this method
+	# returns and on which locations are still to be visited (the cargo
+	# follows from what was bought and sold).
+	def key(self):
+		return self.open_missions, self.needed
+
+
+	# This method returns the best score() that any route can have that
+	# continues from here and visits the locations in < not_visited > (a
+	# bitset of positions in self.locations). The real score() may be worse, 
+	# it is NEVER better.
+	# A mission stays open for sure if its station is not visited anymore or
+	# if not enough of the commodity can be in the cargo bay when I get 
+	# there. The latter is the case if the commodity can't be bought at 
+	# another location before. A commodity still needs to be bought for 
+	# sure if none of the locations left has it or if it needs more space 
+	# than the whole cargo bay has.
+	def bound(self, not_visited):
+		bought_at = self._bought_at
+		needed = self.needed
+		needed_count = 0
+		for ware in self._wanted:
+			if needed >> ware & 1 and not bought_at[ware] & not_visited:
+				needed_count += 1
+
+		remaining_missions = 0
+		quantity = self.quantity
+		open_missions = self.open_missions
+		for mission, (ware, this_quantity) in enumerate(self._missions):
+			if not open_missions >> mission & 1:
+				continue
+
+			location = self._mission_location[mission]
+			if location < 0 or not not_visited >> location & 1:
+				remaining_missions += 1
+				continue
+
+			most = quantity[ware]
+			if needed >> ware & 1 and \
+								bought_at[ware] & not_visited & ~(1 << location):
+				most += self.needed_quantity[ware]
+			if this_quantity > most:
+				remaining_missions += 1
+
+		return remaining_missions, needed_count
+
+
+	# This method returns the score() before anything was done (not even at
+	# the station where I start).
+	def nothing_done(self):
+		return self._start_remaining, self._start_needed_count
+
+
+	# How good a route is: the number of missions that are still open and
+	# the number of commodities that still need to be bought. The smaller the
+	# better.
+	def score(self):
+		return self.remaining_missions, self.needed_count
+
+
+	# This method flies the route < locations > (positions in
+	# self.locations) from the start and returns its score().
+	def fly(self, locations):
+		self.undo(0)
+
+		for stop in locations:
+			self.visit(stop)
+
+		return self.remaining_missions, self.needed_count
@@ -0,0 +1,132 @@
+#    "class_spatialindex" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file contains the class definition for a simple spatial index over the
+# coordinates of all systems. It is used in class DataGrabber() to find the
+# systems around the home system without checking every system in the galaxy.
+
+import numpy as np
+
+
+# The galaxy is divided into cubic cells of equal size. Each system is sorted
+# into the cell it is in. To find all systems within a given radius just the
+# cells that are (partially) within that radius need to be looked at.
+#
+# The cells are stored as a sorted array of (packed) cell coordinates. For
+# each cell it is known where its systems start in an array that contains the
+# indices of all systems sorted by their cell.
+class SpatialIndex(object):
+	# Cells are identified by three integers. These are packed into one
+	# integer with this many bits per coordinate. Since the galaxy is ca.
+	# 100,000 ly across that is more than enough for any reasonable cell size.
+	bits = 21
+	offset = 2**20
+
+	# < cell_size > is the length of the edge of a cell in lightyears.
+	def __init__(self, cell_size = 50.0):
+		self.cell_size = cell_size
+		# The packed cell coordinates of all non-empty cells in ascending
+		# order ...
+		self.keys = np.zeros(0, dtype = 'i8')
+		# ... where in self.order the systems of each cell start (this has
+		# one element more than self.keys so that the end of the last cell
+		# is known, too) ...
+		self.starts = np.zeros(1, dtype = 'i8')
+		# ... and the indices of the systems sorted by cell.
+		self.order = np.zeros(0, dtype = 'i8')
+
+
+	# This method converts coordinates into integer cell coordinates.
+	def _cell(self, coordinate):
+		return np.floor(np.asarray(coordinate) / self.cell_size).astype('i8')
+
+
+	# This method packs the three integer cell coordinates into one integer.
+	def _pack(self, cell_x, cell_y, cell_z):
+		x = (cell_x + self.offset) << (2 * self.bits)
+		y = (cell_y + self.offset) << self.bits
+		z = cell_z + self.offset
+
+		return x | y | z
+
+
+	# This method sorts all systems into their cells.
+	# < x, y, z > are arrays with the coordinates of all systems. The position
+	# of a system in these arrays is what query() returns.
+	def build(self, x, y, z):
+		keys = self._pack(self._cell(x), self._cell(y), self._cell(z))
+
+		# A stable sort keeps systems within one cell in the original order.
+		self.order = np.argsort(keys, kind = 'stable').astype('i8')
+		sorted_keys = keys[self.order]
+
+		self.keys, first = np.unique(sorted_keys, return_index = True)
+		self.starts = np.append(first, len(sorted_keys)).astype('i8')
+
+
+	# The index is saved next to the database so that it needs to be build
+	# just once per download.
+	def save(self, filename):
+		with open(filename, 'wb') as f:
+			np.savez(f, cell_size = self.cell_size, keys = self.keys, \
+									starts = self.starts, order = self.order)
+
+
+	def load(self, filename):
+		with np.load(filename) as this:
+			self.cell_size = float(this['cell_size'])
+			self.keys = this['keys']
+			self.starts = this['starts']
+			self.order = this['order']
+
+
+	# This method returns the indices of all systems in cells that are (at
+	# least partially) within < radius > around < x, y, z >. The indices are
+	# sorted in ascending order.
+	# ATTENTION: The result may contain systems that are further away than
+	# < radius >. The exact check needs to be done by the caller.
+	def query(self, x, y, z, radius):
+		center = np.array([x, y, z], dtype = 'f8')
+		low = self._cell(center - radius)
+		high = self._cell(center + radius)
+
+		ranges = [np.arange(low[i], high[i] + 1) for i in range(3)]
+		cell_x, cell_y, cell_z = [this.ravel() for this in \
+									np.meshgrid(*ranges, indexing = 'ij')]
+
+		# Cells in the corners of the bounding box may not be within the
+		# radius at all. The distance to the closest point of a cell decides.
+		cells = np.stack([cell_x, cell_y, cell_z], axis = 1)
+		lower_corner = cells * self.cell_size
+		closest = np.clip(center, lower_corner, lower_corner + self.cell_size)
+		close_enough = ((closest - center)**2).sum(axis = 1) <= radius**2
+
+		wanted = self._pack(cell_x, cell_y, cell_z)[close_enough]
+
+		# Not every cell contains systems.
+		positions = np.searchsorted(self.keys, wanted)
+		inside = positions < len(self.keys)
+		positions = positions[inside]
+		positions = positions[self.keys[positions] == wanted[inside]]
+
+		found = [self.order[self.starts[i]:self.starts[i + 1]] for i in positions]
+
+		if not found:
+			return np.zeros(0, dtype = 'i8')
+
+		return np.sort(np.concatenate(found))
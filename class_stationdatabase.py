@@ -0,0 +1,391 @@
+#    "class_stationdatabase" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file contains the class definition for the database of relevant
+# stations as it is stored on disk by class DataGrabber().
+#
+# Unpickling a dict with thousands of stations (each with a list of strings)
+# takes long and needs a lot of memory. Thus the database is stored in a
+# binary format that can be memory-mapped. Opening it takes the same time no
+# matter how many stations are in it. Just the stations that are actually
+# looked at are read from disk.
+#
+# The file consists of a header and the following sections:
+# - stations: one record of fixed size per station (id, name, type, system,
+#   distance and where in the warez section its commodities are).
+# - sorted ids and lookup: the station ids in ascending order and where the
+#   respective record is in the stations section (to find a station fast).
+# - string offsets and strings: ALL names (of stations, systems, types and
+#   commodities) are stored just once as UTF-8 in one block of bytes. A name
+#   is referenced by its position in this string table.
+# - warez: the positions in the string table of the commodities available at
+#   the stations. The commodities of one station follow each other.
+#
+# The warez are the last section. Thus the commodities of a station can be
+# replaced without writing the whole file again (see update_warez()): The new
+# commodities are appended at the end of the file and the record of the
+# station is changed to point to them.
+#
+# Which stations carry a commodity is asked for often (by Trader() and for
+# --commodity-available). Thus StationDatabase() holds an inverted index from
+# the (normalized) name of a commodity to the stations where it is available.
+# The index is NOT stored in the file. It is build with a few numpy operations
+# from the stations and warez sections when it is needed for the first time.
+# That way it can't be outdated after update_warez().
+#
+# ATTENTION: If the format changes, VERSION needs to be increased!
+
+from collections.abc import Mapping
+import mmap
+import os
+import struct
+import numpy as np
+
+
+MAGIC = b'TMODB\x00\x00\x00'
+VERSION = 2
+
+# magic, version, number of stations, number of strings, number of warez and
+# the positions (in bytes) of the sections in the file.
+HEADER = struct.Struct('<8sI4xqqqqqqqqq')
+
+STATION = np.dtype([('id', '<i8'), ('name', '<i4'), ('type', '<i4'), \
+					('system', '<i4'), ('unused', '<i4'), ('distance', '<f8'), \
+					('warez_start', '<i8'), ('warez_end', '<i8')])
+
+
+# This function writes the database to < filename >.
+# < data > is a dict as described in DataGrabber.__init__() (or an instance
+# of class StationDatabase()).
+# < names > are additional names that shall be in the string table (e.g., all
+# commodities so that update_warez() can use them).
+# The file is written under another name first and renamed afterwards.
+# Thus an instance of StationDatabase() that has the old file open can still
+# be used.
+def write_database(filename, data, names = ()):
+	strings = {}
+
+	# None (e.g., for an unknown type) is stored as -1.
+	def string_id(name):
+		if name is None:
+			return -1
+		if name not in strings:
+			strings[name] = len(strings)
+		return strings[name]
+
+	stations = np.zeros(len(data), dtype = STATION)
+	warez = []
+
+	for i, (station_id, information) in enumerate(data.items()):
+		stations[i]['id'] = station_id
+		stations[i]['name'] = string_id(information['name'])
+		stations[i]['type'] = string_id(information['type'])
+		stations[i]['system'] = string_id(information['system'])
+		distance = information['distance']
+		stations[i]['distance'] = np.nan if distance is None else distance
+		stations[i]['warez_start'] = len(warez)
+		warez.extend([string_id(commodity) for commodity in information['warez']])
+		stations[i]['warez_end'] = len(warez)
+
+	for name in names:
+		string_id(name)
+
+	lookup = np.argsort(stations['id'], kind = 'stable').astype('<i8')
+	sorted_ids = stations['id'][lookup]
+
+	encoded = [name.encode('utf-8') for name in strings]
+	offsets = np.zeros(len(encoded) + 1, dtype = '<i8')
+	offsets[1:] = np.cumsum([len(this) for this in encoded])
+
+	sections = [stations.tobytes(), sorted_ids.tobytes(), lookup.tobytes(), \
+				offsets.tobytes(), b''.join(encoded), \
+				np.array(warez, dtype = '<i4').tobytes()]
+
+	# Each section starts at a multiple of 8 bytes.
+	positions = []
+	position = HEADER.size
+	for section in sections:
+		position += -position % 8
+		positions.append(position)
+		position += len(section)
+
+	header = HEADER.pack(MAGIC, VERSION, len(stations), len(encoded), \
+														len(warez), *positions)
+
+	temporary = filename + '.part'
+	with open(temporary, 'wb') as f:
+		f.write(header)
+		for position, section in zip(positions, sections):
+			f.write(b'\x00' * (position - f.tell()))
+			f.write(section)
+
+	os.replace(temporary, filename)
+
+
+# This function replaces the commodities of some stations in the file
+# < filename > without writing the whole file again.
+# < changes > is a dict with station ids as keys and lists with the names of
+# the now available commodities as values. Stations that are not in the
+# database and commodities that are not in the string table are ignored.
+# ATTENTION: An instance of StationDatabase() that has the file open still
+# shows the old commodities. The file needs to be opened again.
+def update_warez(filename, changes):
+	database = StationDatabase(filename)
+	string_ids = {database.string(i):i for i in range(len(database._strings))}
+	n_warez = len(database._warez)
+
+	records = []
+	appended = []
+	for station_id, warez in changes.items():
+		position = database._position(station_id)
+		if position < 0:
+			continue
+
+		these = [string_ids[name] for name in warez if name in string_ids]
+		records.append((position, n_warez + len(appended), \
+										n_warez + len(appended) + len(these)))
+		appended.extend(these)
+
+	if not records:
+		return
+
+	header = list(HEADER.unpack_from(database._mm, 0))
+	first_record = database._positions[0]
+	# This closes the file, too.
+	del database
+
+	# The order of writing is chosen so that the file is never broken: first
+	# the new commodities, than the header that tells that they are there 
+	# and at last the stations that point to them.
+	with open(filename, 'r+b') as f:
+		f.seek(0, 2)
+		f.write(np.array(appended, dtype = '<i4').tobytes())
+
+		header[4] = n_warez + len(appended)
+		f.seek(0)
+		f.write(HEADER.pack(*header))
+
+		for position, start, end in records:
+			f.seek(first_record + position * STATION.itemsize + \
+										STATION.fields['warez_start'][1])
+			f.write(np.array([start, end], dtype = '<i8').tobytes())
+
+
+# The names of commodities are compared in lower case and without surrounding
+# whitespace since the user may not write them exactly as in the game.
+def normalize(name):
+	return name.strip().lower()
+
+
+# This object behaves like the (read-only) dict described in
+# DataGrabber.__init__(). However, the information about a station is read
+# from the file just when it is asked for.
+class StationDatabase(Mapping):
+	# < filename > is the path to a file written by write_database().
+	def __init__(self, filename):
+		self.filename = filename
+
+		with open(filename, 'rb') as f:
+			# An empty file can't be memory-mapped.
+			if os.fstat(f.fileno()).st_size < HEADER.size:
+				raise ValueError("{} is not a station database.".format(filename))
+			self._mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+		magic, version, n_stations, n_strings, n_warez, *positions = \
+									HEADER.unpack_from(self._mm, 0)
+
+		if magic != MAGIC or version != VERSION:
+			self._mm.close()
+			raise ValueError("{} is not a station database.".format(filename))
+
+		def section(dtype, count, position):
+			return np.frombuffer(self._mm, dtype = dtype, count = count, \
+															offset = position)
+
+		self._stations = section(STATION, n_stations, positions[0])
+		self._sorted_ids = section('<i8', n_stations, positions[1])
+		self._lookup = section('<i8', n_stations, positions[2])
+		self._offsets = section('<i8', n_strings + 1, positions[3])
+		self._blob = positions[4]
+		self._warez = section('<i4', n_warez, positions[5])
+		self._positions = positions
+
+		# Decoded names are remembered since the same few names (e.g., of
+		# commodities) are asked for again and again.
+		self._strings = [None] * n_strings
+
+		# See _build_index().
+		self._index = None
+
+
+	# This method returns the name with the position < string_id > in the
+	# string table.
+	def string(self, string_id):
+		if string_id < 0:
+			return None
+
+		if self._strings[string_id] is None:
+			start = self._blob + int(self._offsets[string_id])
+			end = self._blob + int(self._offsets[string_id + 1])
+			self._strings[string_id] = self._mm[start:end].decode('utf-8')
+
+		return self._strings[string_id]
+
+
+	# This method returns the position of the record of the station with
+	# < station_id > in the stations section or -1 if it doesn't exist.
+	def _position(self, station_id):
+		i = int(np.searchsorted(self._sorted_ids, station_id))
+
+		if i < len(self._sorted_ids) and self._sorted_ids[i] == station_id:
+			return int(self._lookup[i])
+
+		return -1
+
+
+	# This method builds the inverted index. It consists of ...
+	# - ... a dict with the normalized names of the commodities as keys and 
+	#   (start, end) as values ...
+	# - ... which is the range in an array with the positions of the stations 
+	#   that have the commodity. 
+	# Within the range of one commodity the stations are ranked like in 
+	# Trader._find_furthest(): NON-planetary stations first, then by the 
+	# distance to the point of entry (unknown distances last).
+	def _build_index(self):
+		stations = self._stations
+		lengths = stations['warez_end'] - stations['warez_start']
+		owners = np.repeat(np.arange(len(stations), dtype = 'i8'), lengths)
+
+		# The warez of all stations, one after the other. After update_warez()
+		# the section also contains warez that no station points to anymore. 
+		# These are left out.
+		first = np.cumsum(lengths) - lengths
+		entries = np.arange(int(lengths.sum()), dtype = 'i8') - \
+					np.repeat(first, lengths) + \
+					np.repeat(stations['warez_start'], lengths)
+		commodities = self._warez[entries].astype('i8')
+
+		types, which = np.unique(stations['type'], return_inverse = True)
+		on_planet = np.array([this >= 0 and \
+						'planetary' in self.string(int(this)).lower() \
+						for this in types.tolist()], dtype = bool)
+		on_planet = on_planet[which]
+		distance = np.nan_to_num(stations['distance'], nan = np.inf)
+		rank = np.empty(len(stations), dtype = 'i8')
+		rank[np.lexsort((distance, on_planet))] = np.arange(len(stations))
+
+		self._rank = rank
+
+		order = np.lexsort((rank[owners], commodities))
+		commodities = commodities[order]
+		self._index_positions = owners[order]
+
+		names, starts = np.unique(commodities, return_index = True)
+		ends = np.append(starts[1:], len(commodities))
+
+		self._index = {}
+		for name, start, end in zip(names.tolist(), starts.tolist(), \
+															ends.tolist()):
+			# Two different names may be the same after normalization.
+			key = normalize(self.string(name))
+			self._index.setdefault(key, []).append((start, end))
+
+
+	# This method returns the ids of the stations that have < commodity >.
+	# The best station (see _build_index()) comes first.
+	def stations_with(self, commodity):
+		if self._index is None:
+			self._build_index()
+
+		ranges = self._index.get(normalize(commodity), [])
+		positions = [self._index_positions[start:end] for start, end in ranges]
+
+		if not positions:
+			return []
+
+		positions = np.concatenate(positions)
+		# If several names were found the stations need to be ranked again.
+		if len(ranges) > 1:
+			positions = np.unique(positions)
+			positions = positions[np.argsort(self._rank[positions])]
+
+		return self._stations['id'][positions].tolist()
+
+
+	# This method returns the ids of the stations in < station_ids > in the
+	# same order as they are in the database (see __iter__()). Ids that are
+	# not in the database are left out. Just the given stations are looked 
+	# at, not all stations of the database.
+	def in_order(self, station_ids):
+		station_ids = np.fromiter(station_ids, dtype = 'i8')
+		if not len(station_ids) or not len(self._sorted_ids):
+			return []
+
+		i = np.searchsorted(self._sorted_ids, station_ids)
+		i = np.minimum(i, len(self._sorted_ids) - 1)
+
+		found = self._sorted_ids[i] == station_ids
+		positions = np.sort(self._lookup[i[found]])
+
+		return self._stations['id'][positions].tolist()
+
+
+	def __getitem__(self, station_id):
+		position = self._position(station_id)
+
+		if position < 0:
+			raise KeyError(station_id)
+
+		record = self._stations[position]
+		warez = self._warez[record['warez_start']:record['warez_end']]
+		distance = float(record['distance'])
+
+		return {'name':self.string(record['name']), \
+				'type':self.string(record['type']), \
+				'system':self.string(record['system']), \
+				'distance':None if distance != distance else distance, \
+				'warez':[self.string(i) for i in warez.tolist()]}
+
+
+	def __contains__(self, station_id):
+		return self._position(station_id) >= 0
+
+
+	# The stations are returned in the same order they were in when the
+	# database was written.
+	def __iter__(self):
+		return iter(self._stations['id'].tolist())
+
+
+	def __len__(self):
+		return len(self._stations)
+
+
+	# The database is never changed. Thus a copy (e.g., of a Trader() that
+	# holds the database) can use the same object.
+	def __deepcopy__(self, memo):
+		return self
+
+
+	# A memory-mapped file can't be pickled. Just the name of the file is.
+	def __getstate__(self):
+		return {'filename':self.filename}
+
+
+	def __setstate__(self, state):
+		self.__init__(state['filename'])
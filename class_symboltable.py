@@ -0,0 +1,91 @@
+#    "class_symboltable" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file contains the class definition for the object that gives names 
+# (e.g., of commodities) small integer ids as used in class Trader().
+#
+# With ids, a set of names can be stored as ONE integer in which the bit at 
+# position < id > is set if the name is in the set (a bitset). Comparing, 
+# combining or copying such a set is much faster than doing this with a set 
+# of strings.
+
+
+class SymbolTable(object):
+	def __init__(self):
+		# The id of a name is its position in self._names.
+		self._ids = {}
+		self._names = []
+
+
+	# This method returns the id of < name >. If < name > is not yet known it 
+	# gets the next free id.
+	def add(self, name):
+		if name not in self._ids:
+			self._ids[name] = len(self._names)
+			self._names.append(name)
+
+		return self._ids[name]
+
+
+	# This method returns the id of < name > or < default > if < name > is 
+	# not known.
+	def get(self, name, default = None):
+		return self._ids.get(name, default)
+
+
+	def name(self, this_id):
+		return self._names[this_id]
+
+
+	# This method returns the bitset of all < names > that are known. Unknown
+	# names are ignored.
+	def bits(self, names):
+		bits = 0
+		for name in names:
+			this_id = self._ids.get(name)
+			if this_id is not None:
+				bits |= 1 << this_id
+
+		return bits
+
+
+	# This method returns the names in the bitset < bits > ordered by id.
+	def names(self, bits):
+		return [name for this_id, name in enumerate(self._names) \
+														if bits >> this_id & 1]
+
+
+	# This method returns how many names are in the bitset < bits >.
+	@staticmethod
+	def count(bits):
+		return bin(bits).count('1')
+
+
+	def __contains__(self, name):
+		return name in self._ids
+
+
+	def __len__(self):
+		return len(self._names)
+
+
+	# Names are just added while the mission data is read. Afterwards the 
+	# table doesn't change anymore. Thus a copy (e.g., of a Trader() that 
+	# holds the table) can use the same object.
+	def __deepcopy__(self, memo):
+		return self
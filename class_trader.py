@@ -24,6 +24,7 @@
 
 import class_commodity as cc
 import class_datagrabber as cd
+import class_symboltable as cy
 
 
 # The object that contains all methods that are necessary to get all the
@@ -41,13 +42,21 @@ class Trader(object):
 	# < minimum_supply > is the minimum suply of a commodity that needs to be 
 	# available at a station so that this station is considered a relevant
 	# location.
+	# < workers > is the number of processes that may be used for the heavy 
+	# lifting.
+	# < market_updates > is a file or "host:port" from where updates of the
+	# commodities at single stations can be read (see 
+	# DataGrabber._read_market_updates()).
 	def __init__(self, path, jumprange, cargo, padsize, max_jumps, \
-												max_distance, minimum_supply):
+			max_distance, minimum_supply, workers = 1, market_updates = None):
 		print("Creating the starship ...")
 		self.missions_file = path + '000_missions.txt'
 		# This will hold all class Commodity() objects for all mission
-		# commodities.
+		# commodities. A commodity is at the position of its id in ...
 		self.warez = []
+		# ... this table. Sets of commodities are bitsets of these ids (see 
+		# class SymbolTable()).
+		self.commodities = cy.SymbolTable()
 		# See comments above for what all of that means.
 		self.jumprange = jumprange
 		self.free_cargo = cargo
@@ -55,21 +64,23 @@ class Trader(object):
 		self.max_jumps = max_jumps
 		self.max_distance = max_distance
 		self.minimum_supply = minimum_supply
+		self.workers = workers
+		self.market_updates = market_updates
 
 		# Some information about the system I start in. Will be filled in 
 		# _collect_mission_data()
 		self.start_system = None
 		self.start_station = None
-		self.start_commodities = set()
+		self.start_commodities = 0
 		# These are the locations that need to be visited. It's a double
 		# nested dict with the system names as keys and the station names as 
-		# sub-keys. The value is a set with the commodities available at the 
-		# given location.
+		# sub-keys. The value is a bitset with the commodities available at 
+		# the given location.
 		self.locations = {}
 		# All commodities I'll need to buy somewhere and how much I need.
 		self.needed_commodities = {}
-		# Commodities that can NOT be found at mission locations.
-		self.detour_commodities = set()
+		# Commodities that can NOT be found at mission locations (a bitset).
+		self.detour_commodities = 0
 		# Due to how things are handled is it convenient to know the system
 		# to which a regular delivery has to be made (so NOT source and return
 		# missions but just hauling stuff out there).
@@ -151,14 +162,14 @@ class Trader(object):
 	# This method does the check and returns the repsective < ware > if it 
 	# already exists.
 	def _commodity_in_inventory(self, commodity):
-		for ware in self.warez:
-			if ware.name == commodity:
-				# ATTENTION: THIS returns the pointer to the object and NOT a
-				# copy of the object. Thus I can manipulate it further 
-				# afterwards.
-				return ware
+		this_id = self.commodities.get(commodity)
+
+		if this_id is None:
+			return None
 
-		return None
+		# ATTENTION: THIS returns the pointer to the object and NOT a copy of
+		# the object. Thus I can manipulate it further afterwards.
+		return self.warez[this_id]
 
 
 	# This method reads each line from the mission file and determines the
@@ -177,7 +188,7 @@ class Trader(object):
 		if system not in self.locations:
 			self.locations[system] = {}
 		if station not in self.locations[system]:
-			self.locations[system][station] = set()
+			self.locations[system][station] = 0
 
 		# Remember which and how many commodities I need. However, the 
 		# commodity "delivery" shall NOT appear in self.needed_commodities
@@ -193,7 +204,7 @@ class Trader(object):
 		ware = self._commodity_in_inventory(commodity)
 
 		if not ware:
-			ware = cc.Commodity(commodity)
+			ware = cc.Commodity(commodity, self.commodities.add(commodity))
 			self.warez.append(ware)
 
 		self._update_ware(ware, system, station, quantity, 'sellpoint')
@@ -229,19 +240,29 @@ class Trader(object):
 	# jumps. That doesn't mean that these stations sell what I need.
 	# Thus, this function checks this and includes just the relevant 
 	# information into self.warez
+	# Just the stations that the index of the database knows to have at 
+	# least one of the needed commodities are looked at. However, they are 
+	# looked at in the order of the database, since the order matters if 
+	# stations are equally good (see _find_furthest()).
 	def _find_stations_to_buy_from(self):
 		needed_commodities = set(self.needed_commodities.keys())
+		needed_bits = self.commodities.bits(needed_commodities)
 
-		for station_id, information in self.data.items():
-			offered_commodities = set(information['warez'])
-			buy_here = offered_commodities.intersection(needed_commodities)
+		candidates = set()
+		for commodity in needed_commodities:
+			candidates.update(self.data.stations_with(commodity))
+
+		for station_id in self.data.in_order(candidates):
+			information = self.data[station_id]
+			offered_commodities = self.commodities.bits(information['warez'])
+			buy_here = offered_commodities & needed_bits
 
 			# A station may not have anything I need. In that case I don't need
 			# to go further.
 			if not buy_here:
 				continue
 
-			for commodity in buy_here:
+			for commodity in self.commodities.names(buy_here):
 				system = information['system']
 				station = information['name']
 				distance = information['distance']
@@ -257,14 +278,14 @@ class Trader(object):
 				# If the station is also a mission location, I add here the 
 				# information that I can buy a commodity of interest there.
 				try:
-					self.locations[system][station].update([commodity])
+					self.locations[system][station] |= 1 << ware.id
 				except KeyError:
 					pass
 
 				# Since I'm already at it I can also set the commodities at
 				# the origin location. It's handy to have it later.
 				if system == self.start_system and station == self.start_station:
-					self.start_commodities.update([commodity])
+					self.start_commodities |= 1 << ware.id
 
 
 	# Due to how the data and self.warez are structured and defined I would need 
@@ -289,7 +310,7 @@ class Trader(object):
 					# At this point JUST the mission locations can be found in
 					# self.locations and the sub-dicts contain the commodities
 					# that can be bought there.
-					if ware.name in self.locations[system][station]:
+					if self.locations[system][station] >> ware.id & 1:
 						return True
 				except KeyError:
 					pass
@@ -307,7 +328,7 @@ class Trader(object):
 			if self._mission_has_commodity(ware):
 				continue
 			else:
-				self.detour_commodities.update([ware.name])
+				self.detour_commodities |= 1 << ware.id
 
 
 	# It turned out that it is handy to order (and store) the information in 
@@ -315,10 +336,8 @@ class Trader(object):
 	# This function does that.
 	def _set_warez_per_location(self):
 		for ware in self.warez:
-			commodity = ware.name
-
 			# Don't consider commodities that can be found at mission locations.
-			if commodity not in self.detour_commodities:
+			if not self.detour_commodities >> ware.id & 1:
 				continue
 
 			for system, stations in ware.buy_at.items():
@@ -327,9 +346,9 @@ class Trader(object):
 
 				for station in stations:
 					if station not in self.warez_per_location[system]:
-						self.warez_per_location[system][station] = set()
+						self.warez_per_location[system][station] = 0
 
-					self.warez_per_location[system][station].update([commodity])
+					self.warez_per_location[system][station] |= 1 << ware.id
 
 
 	# This function exists just to have fewer indentations in _keep_closest().
@@ -361,7 +380,7 @@ class Trader(object):
 
 		# Get the dict that contains the distances.
 		for ware in self.warez:
-			if ware.name in commodities:
+			if commodities >> ware.id & 1:
 				information = ware.buy_at
 				# Since I have in self.check_these stations that have the same 
 				# commodities I can break after I found just one.
@@ -410,10 +429,10 @@ class Trader(object):
 
 	# This function exists just so that keep _keep_closest() is more tidy.
 	def _already_checked(self, commodities, checked_these):
-		if sorted(list(commodities)) in checked_these:
+		if commodities in checked_these:
 			return True
 		else:
-			checked_these.append(sorted(commodities))
+			checked_these.add(commodities)
 			return False
 
 
@@ -426,7 +445,7 @@ class Trader(object):
 		# here because otherwise self.to_be_deleted will contain old elements.
 		self.to_be_deleted = set()
 
-		checked_these = []
+		checked_these = set()
 
 		for system, stations in self.warez_per_location.items():
 			for station, commodities in stations.items():
@@ -460,8 +479,9 @@ class Trader(object):
 		best_commodities = None
 		for system, stations in self.warez_per_location.items():
 			for station, commodities in stations.items():
-				if len(commodities) > max_warez_at_location:
-					max_warez_at_location = len(commodities)
+				count = self.commodities.count(commodities)
+				if count > max_warez_at_location:
+					max_warez_at_location = count
 					best_system = system
 					best_station = station
 					best_commodities = commodities
@@ -471,7 +491,7 @@ class Trader(object):
 
 
 	# Dito.
-	# < best_commodities > is the list with the commodities found at the
+	# < best_commodities > is the bitset with the commodities found at the
 	# station that has the most commodities during the given loop in 
 	# _keep_unique().
 	def _delete_fetched_commodities(self, best_commodities):
@@ -479,12 +499,9 @@ class Trader(object):
 		for system, stations in self.warez_per_location.items():
 			delete_those = []
 			for station in stations:
-				for commodity in best_commodities:
-					# A station may not have a given commodity.
-					try:
-						self.warez_per_location[system][station].remove(commodity)
-					except KeyError:
-						pass
+				# A station may not have a given commodity. That doesn't 
+				# matter for a bitset.
+				self.warez_per_location[system][station] &= ~best_commodities
 
 				# Don't delete while iterating over it.
 				if not self.warez_per_location[system][station]:
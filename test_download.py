@@ -0,0 +1,245 @@
+#    "test_download" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file checks the downloads of DataGrabber() against a local stand-in
+# for the server that the rawdata comes from. The stand-in sends the files
+# gzip compressed and with an ETag, answers "not modified" (304) and sends
+# just a part of a file (206) if asked for it with If-Range.
+#
+# Run it with
+#     python3 -m unittest test_download
+# (or with pytest).
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import class_datagrabber as cd
+
+
+# The files the stand-in has. The content is repeated so that the
+# compressed files are large enough to be split up.
+FILES = {name:(name + " 0123456789\n").encode() * 5000 for name in \
+				['systems_populated.json', 'stations.json', 'commodities.json', \
+				'listings.csv']}
+
+
+# The stand-in for the server. What it got asked for is remembered in
+# self.server.requests.
+class StandIn(BaseHTTPRequestHandler):
+	def do_GET(self):
+		name = self.path.lstrip('/')
+		self.server.requests.append((name, dict(self.headers)))
+
+		if name not in self.server.files:
+			self.send_error(404)
+			return
+
+		body, etag = self.server.files[name]
+
+		if self.headers.get('If-None-Match') == etag:
+			self.send_response(304)
+			self.send_header('ETag', etag)
+			self.end_headers()
+			return
+
+		start = 0
+		this_range = self.headers.get('Range')
+		if this_range and self.headers.get('If-Range') == etag:
+			start = int(this_range[len('bytes='):].rstrip('-'))
+
+		if start:
+			self.send_response(206)
+			self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, \
+												len(body) - 1, len(body)))
+		else:
+			self.send_response(200)
+
+		self.send_header('ETag', etag)
+		self.send_header('Content-Encoding', 'gzip')
+		self.send_header('Content-Length', str(len(body) - start))
+		self.end_headers()
+		self.wfile.write(body[start:])
+
+
+	# The test output shall not be full of the requests.
+	def log_message(self, *arguments):
+		pass
+
+
+class TestDownload(unittest.TestCase):
+	def setUp(self):
+		self.path = tempfile.mkdtemp() + os.sep
+
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+		self.server.requests = []
+		self.server.files = {}
+		for name, content in FILES.items():
+			self._put_on_server(name, content, '"1"')
+
+		thread = threading.Thread(target = self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+
+		# DataGrabber() downloads and builds the database when it is
+		# instantiated. Here just the downloads are of interest.
+		self.grabber = cd.DataGrabber.__new__(cd.DataGrabber)
+		self.grabber.path = self.path
+		self.grabber.systems_file = self.path + 'systems_populated.json'
+		self.grabber.stations_file = self.path + 'stations.json'
+		self.grabber.commodities_file = self.path + 'commodities.json'
+		self.grabber.listings_file = self.path + 'listings.csv'
+		self.grabber.download_state_file = self.path + '111_downloads.json'
+		self.grabber.download_state = self.grabber._load_download_state()
+		self.grabber.grab_data_from_raw = False
+		self.grabber.download_url = 'http://127.0.0.1:{}/'.format( \
+													self.server.server_port)
+		# Small chunks such that the files are written in several pieces.
+		self.grabber.download_chunk_size = 4096
+
+		self.file = self.path + 'listings.csv'
+		self.url = self.grabber.download_url + 'listings.csv'
+
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+		shutil.rmtree(self.path)
+
+
+	def _put_on_server(self, name, content, etag):
+		self.server.files[name] = (gzip.compress(content), etag)
+
+
+	def _download(self, force_download = False):
+		return self.grabber._do_the_download(self.file, self.url, 'LISTINGS', \
+															force_download)
+
+
+	def _read(self, this_file):
+		with open(this_file, 'rb') as f:
+			return f.read()
+
+
+	def test_gzip_is_stored_on_disk_and_decompressed_at_the_end(self):
+		self.assertTrue(self._download())
+
+		_, headers = self.server.requests[-1]
+		self.assertIn('gzip', headers.get('Accept-Encoding', ''))
+		self.assertEqual(self._read(self.file), FILES['listings.csv'])
+		self.assertFalse(os.path.exists(self.file + '.part'))
+		self.assertFalse(os.path.exists(self.file + '.new'))
+
+		state = self.grabber.download_state['listings.csv']
+		self.assertEqual(state['etag'], '"1"')
+		self.assertNotIn('partial', state)
+		with open(self.grabber.download_state_file, 'r') as f:
+			self.assertEqual(json.load(f)['listings.csv']['etag'], '"1"')
+
+
+	def test_not_modified(self):
+		self._download()
+		modified = os.path.getmtime(self.file)
+
+		self.assertFalse(self._download())
+
+		_, headers = self.server.requests[-1]
+		self.assertEqual(headers.get('If-None-Match'), '"1"')
+		self.assertEqual(os.path.getmtime(self.file), modified)
+		self.assertEqual(self._read(self.file), FILES['listings.csv'])
+
+
+	def test_force_download_ignores_not_modified(self):
+		self._download()
+
+		# The content is the same. Thus the file is not changed.
+		self.assertFalse(self._download(force_download = True))
+
+		_, headers = self.server.requests[-1]
+		self.assertNotIn('If-None-Match', headers)
+
+
+	def test_new_version_is_downloaded(self):
+		self._download()
+		self._put_on_server('listings.csv', b"new content\n" * 100, '"2"')
+
+		self.assertTrue(self._download())
+		self.assertEqual(self._read(self.file), b"new content\n" * 100)
+		self.assertEqual(self.grabber.download_state['listings.csv']['etag'], \
+																		'"2"')
+
+
+	# An interrupted download: the first part is in the .part file and the
+	# download state knows which version it is from.
+	def _interrupt_download(self, etag):
+		compressed, _ = self.server.files['listings.csv']
+		self.cut = len(compressed) // 3
+
+		with open(self.file + '.part', 'wb') as f:
+			f.write(compressed[:self.cut])
+
+		self.grabber.download_state['listings.csv'] = {'partial':{'etag':etag, \
+								'last_modified':None, 'encoding':'gzip'}}
+
+
+	def test_resume_with_if_range(self):
+		self._interrupt_download('"1"')
+
+		self.assertTrue(self._download())
+
+		_, headers = self.server.requests[-1]
+		self.assertEqual(headers.get('Range'), 'bytes={}-'.format(self.cut))
+		self.assertEqual(headers.get('If-Range'), '"1"')
+		self.assertEqual(self._read(self.file), FILES['listings.csv'])
+		self.assertNotIn('partial', self.grabber.download_state['listings.csv'])
+
+
+	# If the server has a newer version than the part I have, it sends the
+	# whole new file (200) and the part is thrown away.
+	def test_resume_of_an_old_version_starts_over(self):
+		self._interrupt_download('"0"')
+
+		self.assertTrue(self._download())
+
+		_, headers = self.server.requests[-1]
+		self.assertEqual(headers.get('If-Range'), '"0"')
+		self.assertEqual(self._read(self.file), FILES['listings.csv'])
+
+
+	def test_all_files_are_downloaded(self):
+		self.grabber.download_files()
+
+		self.assertTrue(self.grabber.grab_data_from_raw)
+		for name, content in FILES.items():
+			self.assertEqual(self._read(self.path + name), content)
+
+		# Nothing is asked for again within a day.
+		self.server.requests = []
+		self.grabber.grab_data_from_raw = False
+		self.grabber.download_files()
+
+		self.assertEqual(self.server.requests, [])
+		self.assertFalse(self.grabber.grab_data_from_raw)
+
+
+if __name__ == '__main__':
+	unittest.main()
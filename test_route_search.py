@@ -0,0 +1,239 @@
+#    "test_route_search" (v1.0)
+#    Copyright 2019 Soren Heinze
+#    soerenheinze (at) gmx (dot) de
+#    5B1C 1897 560A EF50 F1EB 2579 2297 FAE4 D9B5 2A35
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This file checks the ways RouteFinder() finds routes against each other
+# and against RouteState.fly(). The missions are made up at random (see
+# make_trader()). Thus no rawdata is needed.
+#
+# Run it with
+#     python3 -m unittest test_route_search
+# (or with pytest).
+
+import contextlib
+import io
+import random
+import unittest
+import numpy as np
+import class_commodity as cc
+import class_routebatch as cb
+import class_routeimprover as ci
+import class_routefinder as cf
+import class_routestate as cr
+import class_symboltable as cy
+import class_trader as ct
+
+
+# This function returns a Trader() with < stations > mission and pick-up
+# stations and < wares > commodities that need to be bought and delivered.
+# Which commodity needs to go where and where it can be bought is random
+# (with < seed >). If < start > is True, I start at a station where some of
+# the commodities can be bought.
+def make_trader(stations, wares, seed, cargo, start = False):
+	generator = random.Random(seed)
+
+	trader = ct.Trader.__new__(ct.Trader)
+	trader.workers = 1
+	trader.commodities = cy.SymbolTable()
+	trader.warez = []
+	trader.needed_commodities = {}
+	trader.free_cargo = cargo
+	trader.start_system = trader.start_station = ''
+	trader.start_commodities = 0
+	trader.locations = {}
+
+	names = [('System {}'.format(i % 5), 'Station {}'.format(i)) \
+													for i in range(stations)]
+	for system, station in names:
+		trader.locations.setdefault(system, {})[station] = 0
+
+	for i in range(wares):
+		name = 'Commodity {}'.format(i)
+		ware = cc.Commodity(name, trader.commodities.add(name))
+		trader.warez.append(ware)
+
+		quantity = 0
+		for _ in range(generator.randint(1, 2)):
+			system, station = generator.choice(names)
+			this_quantity = generator.randint(1, 10)
+			ware.update_sellpoint(system, station, this_quantity)
+			quantity += this_quantity
+		trader.needed_commodities[name] = quantity
+
+		for _ in range(generator.randint(1, 2)):
+			system, station = generator.choice(names)
+			trader.locations[system][station] |= 1 << ware.id
+
+	if start:
+		trader.start_system = 'Home'
+		trader.start_station = 'Home Station'
+		trader.start_commodities = generator.getrandbits(wares)
+
+	return trader
+
+
+# This function returns a RouteFinder() that found the best route for
+# < trader > (without telling about it).
+def find_route(trader, engine = 'search', time_limit = None):
+	with contextlib.redirect_stdout(io.StringIO()):
+		return cf.RouteFinder(trader, engine, time_limit)
+
+
+class TestRouteSearch(unittest.TestCase):
+	# If several routes are equally good (one leaves fewer missions open,
+	# the other needs fewer commodities), the engines may find different
+	# ones. But neither may find a route that is worse than the other one.
+	def test_dp_is_as_good_as_search(self):
+		for seed in range(100):
+			search = find_route(make_trader(7, 6, seed, 25), 'search')
+			dp = find_route(make_trader(7, 6, seed, 25), 'dp')
+
+			search_score = (search.best_remaining_missions, \
+										search.best_needed_commodities)
+			dp_score = (dp.best_remaining_missions, dp.best_needed_commodities)
+
+			self.assertFalse(dp._is_better(*search_score), seed)
+			self.assertFalse(search._is_better(*dp_score), seed)
+			self.assertEqual(dp.state.fly(dp.best_route), dp_score)
+
+
+	# RouteBatch() needs to do exactly the same as RouteState.fly().
+	def test_batch_is_the_same_as_flying_each_route(self):
+		generator = np.random.default_rng(0)
+
+		for seed in range(30):
+			state = cr.RouteState(make_trader(12, 10, seed, 30, seed % 2))
+			batch = cb.RouteBatch(state)
+			routes = generator.random((200, len(state.locations))).argsort(1)
+
+			scores = [state.fly(route) for route in routes.tolist()]
+			remaining_missions, needed_commodities = batch.evaluate(routes)
+
+			self.assertEqual(list(zip(remaining_missions.tolist(), \
+								needed_commodities.tolist())), scores, seed)
+
+
+	# With the best score so far, routes that can't be better anymore are
+	# not flown to the end. Their score may then be too good but it is 
+	# NEVER better than the best score.
+	def test_batch_with_best_is_never_wrongly_better(self):
+		generator = np.random.default_rng(1)
+		finder = cf.RouteFinder.__new__(cf.RouteFinder)
+
+		for seed in range(30):
+			state = cr.RouteState(make_trader(12, 10, seed, 30, seed % 2))
+			batch = cb.RouteBatch(state)
+			routes = generator.random((200, len(state.locations))).argsort(1)
+
+			scores = [state.fly(route) for route in routes.tolist()]
+			finder.best_remaining_missions, finder.best_needed_commodities = \
+															sorted(scores)[100]
+			best = (finder.best_remaining_missions, \
+										finder.best_needed_commodities)
+			remaining_missions, needed_commodities = batch.evaluate(routes, \
+																None, best)
+
+			for score, this in zip(scores, zip(remaining_missions.tolist(), \
+										needed_commodities.tolist())):
+				if this != score:
+					self.assertFalse(finder._is_better(*this), seed)
+				self.assertEqual(finder._is_better(*this), \
+										finder._is_better(*score), seed)
+
+
+	# The score of the route that is found needs to be the one the route 
+	# really has. The missions are such that not all routes can be searched
+	# and the stations are not split into groups.
+	def test_shuffle_finds_what_it_says(self):
+		cf.RouteFinder.seed = 0
+		try:
+			for seed in (0, 2, 3, 4):
+				trader = make_trader(18, 14, seed, 40)
+				with contextlib.redirect_stdout(io.StringIO()):
+					finder = cf.RouteFinder(trader, time_limit = 0.5, \
+													heuristic = 'shuffle')
+
+				score = (finder.best_remaining_missions, \
+										finder.best_needed_commodities)
+				self.assertEqual(finder.state.fly(finder.best_route), score)
+		finally:
+			cf.RouteFinder.seed = None
+
+
+	# With few possible routes (7! = 5040) many random routes are drawn
+	# twice. Still, each route may come just once until as many routes
+	# as remembered (self.heuristic_routes) came.
+	def test_random_routes_come_just_once(self):
+		finder = cf.RouteFinder.__new__(cf.RouteFinder)
+		finder.heuristic_routes = 2000
+		finder.batch_routes = 300
+		generator = np.random.default_rng(0)
+
+		codes = []
+		for these in finder._random_codes(generator, 7):
+			codes.extend(tuple(code) for code in these.tolist())
+			if len(codes) >= finder.heuristic_routes:
+				break
+
+		codes = codes[:finder.heuristic_routes]
+		self.assertEqual(len(set(codes)), len(codes))
+
+		routes = finder._routes_from_codes(np.array(codes))
+		self.assertEqual(len({tuple(route) for route in routes.tolist()}), \
+																len(codes))
+		self.assertTrue((np.sort(routes, 1) == np.arange(7)).all())
+
+
+	# The improver yields each route with its score. A route it didn't fly
+	# to the end comes with None. Every other score needs to be the one the
+	# route really has.
+	def test_improver_yields_real_scores(self):
+		for seed in range(10):
+			trader = make_trader(20, 14, seed, 60, seed % 2)
+			state = cr.RouteState(trader)
+			# The improver flies its routes with < state >. Thus they are
+			# checked with another one.
+			check = cr.RouteState(trader)
+			improver = ci.RouteImprover(state, seed)
+
+			for i, (route, score) in enumerate(improver.routes()):
+				if score is not None:
+					self.assertEqual(check.fly(route), score, seed)
+				if i == 3000:
+					break
+
+
+	# The score that is found with the improver (the default with many 
+	# stations) needs to be the one the route really has.
+	def test_improve_finds_what_it_says(self):
+		cf.RouteFinder.seed = 0
+		try:
+			for seed in range(8):
+				trader = make_trader(20, 20, seed, 40, seed % 2)
+				with contextlib.redirect_stdout(io.StringIO()):
+					finder = cf.RouteFinder(trader, time_limit = 0.3)
+
+				score = (finder.best_remaining_missions, \
+										finder.best_needed_commodities)
+				self.assertEqual(finder.state.fly(finder.best_route), score, \
+																		seed)
+		finally:
+			cf.RouteFinder.seed = None
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -67,14 +67,17 @@ if __name__ == '__main__':
 	max_jumps = args.max_jumps
 	max_distance = args.max_distance
 	minimum_supply = args.minimum_supply
+	workers = args.workers
+	market_updates = args.market_updates
+	time_limit = args.time_limit
 
 	# Yes, my trading ship is called Chicken of Doom :) ... because it's yellow.
 	chicken_of_doom = ct.Trader(path, jumprange, cargo, padsize, max_jumps, \
-														max_distance, minimum_supply)
+						max_distance, minimum_supply, workers, market_updates)
 
 	if args.commodity_available:
-		commodity = args.commodity_available
-		chicken_of_doom.datagrabber.find_commodity(commodity)
+		commodities = args.commodity_available
+		chicken_of_doom.datagrabber.find_commodity(commodities)
 
 	if args.download_files:
 		chicken_of_doom.datagrabber.download_files(True)
@@ -83,7 +86,8 @@ if __name__ == '__main__':
 		chicken_of_doom.datagrabber.build_database(True)
 
 	if args.run:
-		this_route = cf.RouteFinder(chicken_of_doom)
+		this_route = cf.RouteFinder(chicken_of_doom, args.engine, time_limit, \
+												heuristic = args.heuristic)
 		af.print_results(this_route)
 
 